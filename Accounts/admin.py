@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.translation import gettext_lazy as _
 from .models import CustomUserModel, DeleteAccuntsList, UserProfile
+from root.images import thumbnail_url
 
 
 class CustomUserAdmin(UserAdmin):
@@ -45,7 +46,7 @@ class CustomUserProfileAdmin(admin.ModelAdmin):
     def profile_image_tag(self, obj):
         from django.utils.html import format_html
         if obj.profile_image:
-            return format_html('<img src="{}" width="50" height="50" />', obj.profile_image.url)
+            return format_html('<img src="{}" width="50" height="50" />', thumbnail_url(obj.profile_image))
         return "No Image"
     profile_image_tag.short_description = 'Profile Image'
 
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+from root.storage import ContentAddressedStorage, store_existing
+
+
+def address_profile_images(apps, schema_editor):
+    # See shop 0006: profile images move to their content address, and the
+    # old files stay until ``manage.py gc_media_blobs --legacy``.
+    storage = ContentAddressedStorage()
+    UserProfile = apps.get_model("Accounts", "UserProfile")
+    rows = (
+        UserProfile.objects.exclude(profile_image="").exclude(profile_image=None)
+        .values_list("pk", "profile_image")
+    )
+    for pk, name in rows.iterator():
+        new_name = store_existing(storage, name)
+        if new_name != name:
+            UserProfile.objects.filter(pk=pk).update(profile_image=new_name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Accounts', '0006_customusermodel_otp_customusermodel_otp_expiry_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(address_profile_images, migrations.RunPython.noop),
+    ]
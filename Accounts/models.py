@@ -9,6 +9,8 @@ from django.dispatch import receiver
 from django.utils import timezone
 import secrets
 
+from root.images import schedule_derivatives
+
 
 class CustomUserManager(BaseUserManager):
 
@@ -88,6 +90,11 @@ def create_user_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=CustomUserModel)
 def save_user_profile(sender, instance, **kwargs):
     instance.profile.save()
+
+@receiver(post_save, sender=UserProfile)
+def generate_profile_image_derivatives(sender, instance, raw=False, **kwargs):
+    if not raw and instance.profile_image:
+        schedule_derivatives([instance.profile_image.name])
     
 class DeleteAccuntsList(models.Model):
     email = models.EmailField(unique=True)
@@ -2,6 +2,7 @@ from datetime import timezone
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import UserProfile
+from root.images import ImageSrcsetField
 from django.contrib.auth import authenticate
 from django.core.mail import send_mail as send_email
 from rest_framework_simplejwt.tokens import UntypedToken
@@ -49,6 +50,8 @@ class UserLoginSerializer(serializers.Serializer):
 
 # create a custom user profile serializer
 class UserProfileSerializer(serializers.ModelSerializer):
+    profile_image_srcset = ImageSrcsetField(source='profile_image')
+
     class Meta:
         model = UserProfile
         fields = '__all__'
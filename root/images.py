@@ -0,0 +1,230 @@
+"""
+Responsive image derivatives.
+
+Every uploaded product or profile image gets resized copies at
+``IMAGE_DERIVATIVE_WIDTHS`` in each of ``IMAGE_DERIVATIVE_FORMATS``, stored
+next to the original: ``images/watch.jpg`` -> ``images/watch.320w.webp``.
+Derivative names depend only on the original's name, so serializers can
+build ``srcset`` maps without touching storage. Images narrower than a
+width are re-encoded at their own size rather than upscaled.
+
+Derivatives are generated off the request path: ``schedule_derivatives``
+hands them to a small thread pool once the transaction commits, and the
+``generate_image_derivatives`` command backfills existing media.
+"""
+
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, features
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Format name -> (Pillow format, file extension, Pillow feature that must be available).
+FORMATS = {
+    "avif": ("AVIF", "avif", "avif"),
+    "webp": ("WEBP", "webp", "webp"),
+    "jpeg": ("JPEG", "jpg", None),
+}
+DEFAULT_WIDTHS = (160, 320, 640, 1280)
+DEFAULT_QUALITY = {"avif": 50, "webp": 75, "jpeg": 80}
+
+
+def get_widths():
+    return tuple(sorted(getattr(settings, "IMAGE_DERIVATIVE_WIDTHS", DEFAULT_WIDTHS)))
+
+
+@lru_cache(maxsize=None)
+def _supported(fmt):
+    feature = FORMATS[fmt][2]
+    return feature is None or bool(features.check(feature))
+
+
+def get_formats():
+    """Configured formats this Pillow build can write, best first."""
+    formats = getattr(settings, "IMAGE_DERIVATIVE_FORMATS", tuple(FORMATS))
+    return tuple(name for name in formats if name in FORMATS and _supported(name))
+
+
+def derivative_name(name, width, fmt):
+    root, _ = os.path.splitext(name)
+    return f"{root}.{width}w.{FORMATS[fmt][1]}"
+
+
+def srcset_map(name, storage=None, absolute=None):
+    """Return ``{format: "url 160w, url 320w, ..."}`` for image *name*, or ``None``."""
+    if not name:
+        return None
+    storage = storage or default_storage
+    srcset = {}
+    for fmt in get_formats():
+        urls = []
+        for width in get_widths():
+            url = storage.url(derivative_name(name, width, fmt))
+            urls.append(f"{absolute(url) if absolute else url} {width}w")
+        srcset[fmt] = ", ".join(urls)
+    return srcset
+
+
+def rewrite_srcset_map(srcset, rewrite):
+    """Pass every URL of a ``srcset_map`` through *rewrite*."""
+    if not srcset:
+        return srcset
+    rewritten = {}
+    for fmt, value in srcset.items():
+        candidates = []
+        # Storage URLs are percent-encoded, so ", " only separates candidates.
+        for candidate in value.split(", "):
+            url, _, descriptor = candidate.rpartition(" ")
+            candidates.append(f"{rewrite(url)} {descriptor}")
+        rewritten[fmt] = ", ".join(candidates)
+    return rewritten
+
+
+def thumbnail_url(fieldfile, width=160, fmt="jpeg"):
+    """URL of the smallest derivative at least *width* wide, or the original while none exists."""
+    if not fieldfile:
+        return None
+    widths = [w for w in get_widths() if w >= width] or list(get_widths()[-1:])
+    if fmt in get_formats():
+        for candidate in widths:
+            name = derivative_name(fieldfile.name, candidate, fmt)
+            if fieldfile.storage.exists(name):
+                return fieldfile.storage.url(name)
+    return fieldfile.url
+
+
+def _is_fresh(storage, name, original_modified):
+    try:
+        return storage.exists(name) and storage.get_modified_time(name) >= original_modified
+    except NotImplementedError:
+        return storage.exists(name)
+
+
+def _encode(image, fmt):
+    pil_format = FORMATS[fmt][0]
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if fmt == "jpeg":
+        if has_alpha:
+            # JPEG has no alpha channel; flatten onto white.
+            rgba = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    quality = {**DEFAULT_QUALITY, **getattr(settings, "IMAGE_DERIVATIVE_QUALITY", {})}[fmt]
+    buffer = io.BytesIO()
+    options = {"optimize": True, "progressive": True} if fmt == "jpeg" else {}
+    image.save(buffer, format=pil_format, quality=quality, **options)
+    return buffer.getvalue()
+
+
+def generate_derivatives(name, force=False, storage=None):
+    """
+    Write the missing or outdated derivatives of image *name*.
+
+    Returns the number of files written; a missing original writes none.
+    """
+    storage = storage or default_storage
+    if not name or not storage.exists(name):
+        return 0
+    try:
+        original_modified = storage.get_modified_time(name)
+    except NotImplementedError:
+        original_modified = None
+
+    pending = [
+        (width, fmt)
+        for width in get_widths()
+        for fmt in get_formats()
+        if force or original_modified is None
+        or not _is_fresh(storage, derivative_name(name, width, fmt), original_modified)
+    ]
+    if not pending:
+        return 0
+
+    with storage.open(name, "rb") as fh:
+        original = ImageOps.exif_transpose(Image.open(fh))
+        original.load()
+
+    written = 0
+    for width in sorted({width for width, _ in pending}):
+        if original.width > width:
+            height = max(1, round(original.height * width / original.width))
+            resized = original.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        else:
+            resized = original
+        for fmt in (fmt for w, fmt in pending if w == width):
+            target = derivative_name(name, width, fmt)
+            content = ContentFile(_encode(resized, fmt))
+            if hasattr(storage, "save_derived"):
+                # Content-addressed storage would rename the file by its hash.
+                storage.save_derived(target, content)
+            else:
+                if storage.exists(target):
+                    storage.delete(target)
+                storage.save(target, content)
+            written += 1
+    return written
+
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "IMAGE_DERIVATIVE_WORKERS", 2),
+            thread_name_prefix="image-derivatives",
+        )
+    return _executor
+
+
+def _generate_logged(name):
+    try:
+        generate_derivatives(name)
+    except Exception:
+        logger.exception("Generating derivatives for %s failed", name)
+
+
+def schedule_derivatives(names):
+    """Generate derivatives for *names* in the background after the transaction commits."""
+    names = [name for name in dict.fromkeys(names) if name]
+    if not names:
+        return
+
+    def submit():
+        executor = _get_executor()
+        for name in names:
+            executor.submit(_generate_logged, name)
+
+    transaction.on_commit(submit)
+
+
+class ImageSrcsetField(serializers.Field):
+    """Read-only ``{format: srcset}`` map for an image field, e.g. ``source="image"``."""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get("request")
+        return srcset_map(
+            value.name, value.storage, request.build_absolute_uri if request is not None else None
+        )
@@ -0,0 +1,205 @@
+"""
+Serving ``MEDIA_ROOT`` without a separate web server.
+
+``MediaFilesMiddleware`` answers ``MEDIA_URL`` requests with ``serve_media``
+before sessions, auth and URL routing run. Responses carry a
+stat-based ETag and Last-Modified, honour conditional requests and single
+``Range`` requests, and prefer a precompressed ``.br``/``.gz`` sidecar (see
+``root.storage``) when the client accepts it. Content-addressed names never
+change content, so they are cached for a year as ``immutable``; other
+files get ``MEDIA_CACHE_MAX_AGE`` seconds.
+
+A derivative that has not been generated yet is answered with its original,
+uncached, so ``srcset`` URLs work as soon as an upload is saved.
+"""
+
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+from .middleware import choose_encoding
+from .storage import SIDECARS, blob_digest, is_compressible
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """
+    Return the inclusive ``(start, end)`` of a single byte range.
+
+    ``None`` means the header should be ignored and the whole file sent
+    (malformed or multiple ranges); ``False`` means it can't be satisfied.
+    """
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if length == 0 or size == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        return False
+    return start, min(end, size - 1)
+
+
+def _read_range(path, start, length):
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _original_of(path, full_path):
+    """Path of the blob the missing derivative *path* was made from, or ``None``."""
+    digest = blob_digest(path)
+    if digest is None:
+        return None
+    directory = os.path.dirname(full_path)
+    try:
+        entries = os.listdir(directory)
+    except OSError:
+        return None
+    for entry in entries:
+        if os.path.splitext(entry)[0] == digest:
+            return os.path.join(directory, entry)
+    return None
+
+
+def _etag(st, encoding=None):
+    tag = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match:
+        tags = parse_etags(if_none_match)
+        return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+    since = parse_http_date_safe(request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+    return since is not None and int(last_modified) <= since
+
+
+def serve_media(request, path):
+    """Respond with the file at *path* under ``MEDIA_ROOT``."""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Invalid media path")
+
+    cache_control = (
+        IMMUTABLE if blob_digest(path) is not None
+        else f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)}"
+    )
+    try:
+        st = os.stat(full_path)
+    except OSError:
+        full_path = _original_of(path, full_path)
+        if full_path is None:
+            raise Http404("Media file not found")
+        # Stand-in until the derivative exists; don't let it be cached.
+        st = os.stat(full_path)
+        cache_control = "no-cache"
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404("Media file not found")
+
+    content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    headers = {
+        "Cache-Control": cache_control,
+        "Last-Modified": http_date(st.st_mtime),
+        "Accept-Ranges": "bytes",
+    }
+
+    byte_range = None
+    range_header = request.META.get("HTTP_RANGE")
+    if range_header:
+        if_range = request.META.get("HTTP_IF_RANGE")
+        if not if_range or if_range in (_etag(st), headers["Last-Modified"]):
+            byte_range = parse_range(range_header, st.st_size)
+
+    encoding = None
+    if is_compressible(full_path):
+        headers["Vary"] = "Accept-Encoding"
+    if byte_range is None and "Vary" in headers:
+        encoding = choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""), SIDECARS)
+        if encoding is not None:
+            try:
+                sidecar_path = full_path + SIDECARS[encoding]
+                sidecar_st = os.stat(sidecar_path)
+            except OSError:
+                encoding = None
+
+    headers["ETag"] = _etag(st, encoding)
+    if _not_modified(request, headers["ETag"], st.st_mtime):
+        response = HttpResponseNotModified()
+        for header in ("Cache-Control", "ETag", "Last-Modified", "Vary"):
+            if header in headers:
+                response.headers[header] = headers[header]
+        return response
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response.headers["Content-Range"] = f"bytes */{st.st_size}"
+        return response
+
+    if byte_range is not None:
+        start, end = byte_range
+        length = end - start + 1
+        headers["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+        body = None if request.method == "HEAD" else _read_range(full_path, start, length)
+        status = 206
+    else:
+        if encoding is not None:
+            full_path, length = sidecar_path, sidecar_st.st_size
+            headers["Content-Encoding"] = encoding
+        else:
+            length = st.st_size
+        body = None if request.method == "HEAD" else open(full_path, "rb")
+        status = 200
+
+    if body is None:
+        response = HttpResponse(status=status, content_type=content_type)
+    elif status == 206:
+        response = StreamingHttpResponse(body, status=status, content_type=content_type)
+    else:
+        response = FileResponse(body, content_type=content_type)
+    for header, value in headers.items():
+        response.headers[header] = value
+    response.headers["Content-Length"] = str(length)
+    return response
+
+
+class MediaFilesMiddleware(MiddlewareMixin):
+    """Serve GET and HEAD requests under ``MEDIA_URL`` unless ``SERVE_MEDIA`` is off."""
+
+    def process_request(self, request):
+        prefix = settings.MEDIA_URL
+        if (
+            getattr(settings, "SERVE_MEDIA", True)
+            and prefix.startswith("/")
+            and request.method in ("GET", "HEAD")
+            and request.path_info.startswith(prefix)
+        ):
+            return serve_media(request, request.path_info[len(prefix):])
+        return None
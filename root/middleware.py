@@ -1,5 +1,19 @@
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
 from django.utils.deprecation import MiddlewareMixin
 
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is optional
+    zstandard = None
+
 
 class SecurityHeadersMiddleware(MiddlewareMixin):
     """Set security headers for every response."""
@@ -29,3 +43,122 @@ class SecurityHeadersMiddleware(MiddlewareMixin):
         response.headers.pop("X-Powered-By", None)
 
         return response
+
+
+def _compress_gzip(content, level):
+    return gzip.compress(content, compresslevel=level, mtime=0)
+
+
+def _compress_brotli(content, level):
+    return brotli.compress(content, quality=level)
+
+
+def _compress_zstd(content, level):
+    return zstandard.ZstdCompressor(level=level).compress(content)
+
+
+# Encodings the server can produce, best first; ties in the client's
+# Accept-Encoding q-values are broken by this order.
+ENCODERS = {
+    name: compress
+    for name, compress, available in (
+        ("br", _compress_brotli, brotli is not None),
+        ("zstd", _compress_zstd, zstandard is not None),
+        ("gzip", _compress_gzip, True),
+    )
+    if available
+}
+DEFAULT_LEVELS = {"br": 4, "zstd": 3, "gzip": 6}
+
+# Static file types worth precompressing (see root.storage).
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+# Dynamic responses compressed by CompressionMiddleware. HTML pages are left
+# out: they carry CSRF tokens next to reflected input, which compression
+# would expose to BREACH.
+RESPONSE_COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson")
+
+
+def choose_encoding(accept_encoding, available=ENCODERS):
+    """Pick the best of the *available* encodings from an Accept-Encoding header, or ``None``."""
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        weights[name.strip()] = quality
+
+    best, best_quality = None, 0.0
+    for name in ENCODERS:
+        if name not in available:
+            continue
+        quality = weights.get(name, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress JSON API responses with brotli, zstd or gzip.
+
+    The encoding is negotiated from Accept-Encoding (brotli and zstd only
+    when their packages are installed). Streaming responses, responses that
+    already have a Content-Encoding or ``Cache-Control: no-transform``,
+    content types outside ``RESPONSE_COMPRESSIBLE_TYPES`` and bodies under
+    ``RESPONSE_COMPRESSION_MIN_SIZE`` bytes are left alone. Levels come from ``RESPONSE_COMPRESSION_LEVELS``.
+
+    A response can carry a ``compressed_variants`` object (see
+    ``shop.cache``) with ``get(encoding)``/``set(encoding, content)``; the
+    compressed body is then looked up there first and stored after
+    compressing, so cached responses are only compressed once.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+        content_type = response.get("Content-Type", "").lower()
+        if not content_type.startswith(RESPONSE_COMPRESSIBLE_TYPES):
+            return response
+        if "no-transform" in response.get("Cache-Control", "").lower():
+            return response
+        min_size = getattr(settings, "RESPONSE_COMPRESSION_MIN_SIZE", 1024)
+        if len(response.content) < min_size:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        variants = getattr(response, "compressed_variants", None)
+        compressed = variants.get(encoding) if variants is not None else None
+        if compressed is None:
+            levels = {**DEFAULT_LEVELS, **getattr(settings, "RESPONSE_COMPRESSION_LEVELS", {})}
+            compressed = ENCODERS[encoding](response.content, levels[encoding])
+            if len(compressed) >= len(response.content):
+                return response
+            if variants is not None:
+                variants.set(encoding, compressed)
+
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        response.headers["Content-Encoding"] = encoding
+        # The encoded body is a different representation; keep conditional
+        # requests matching by making a strong ETag weak, as GZipMiddleware does.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        return response
@@ -0,0 +1,39 @@
+"""
+JSON request parsing through orjson, with DRF's ``JSONParser`` as fallback.
+"""
+
+import io
+import re
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser, get_encoding
+
+from .renderers import FastJSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+# orjson turns integers wider than 64 bits into floats. The shortest of those
+# has 19 digits (below -2**63), so bodies with 19 digits in a row are parsed
+# by the stdlib.
+_WIDE_INTEGER = re.compile(rb"\d{19}")
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = get_encoding(parser_context or {})
+        # orjson only reads UTF-8 and always rejects NaN/Infinity, so anything
+        # else goes through the stdlib parser.
+        if orjson is None or encoding.lower() not in ("utf-8", "utf8") or not self.strict:
+            return super().parse(stream, media_type, parser_context)
+        content = stream.read()
+        if _WIDE_INTEGER.search(content):
+            return super().parse(io.BytesIO(content), media_type, parser_context)
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
@@ -0,0 +1,66 @@
+"""
+JSON rendering through orjson.
+
+``FastJSONRenderer`` produces the same bytes as DRF's ``JSONRenderer`` for
+compact, unicode output (the project default) but encodes in C. Types orjson
+doesn't handle natively (Decimal, timedelta, lazy strings, querysets, ...)
+go through DRF's own ``JSONEncoder.default``, so they render the way they
+always have. Indented output (``; indent=`` or the browsable API) and
+installs without orjson fall back to the stock renderer.
+
+orjson can't encode integers wider than 64 bits, and writes floats below
+1e-4 or from 1e16 up differently (``1e16`` where Python writes ``1e+16``).
+Data with either is rendered by the stock renderer instead.
+"""
+
+import re
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+_encoder = JSONEncoder()
+
+if orjson is not None:
+    # UTC datetimes end in "Z" and non-string keys are stringified, as the
+    # stdlib encoder does.
+    ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+# Every float orjson formats differently from repr() has an exponent or
+# starts "0.0000". Numbers follow one of ":,[" in compact output, which keeps
+# hex digests in strings from matching, and float keys are whole quoted
+# numbers; the odd match inside a string only costs a needless fallback.
+_FLOAT_MISMATCH = re.compile(
+    rb"(?:^|[:,\[])-?(?:\d+(?:\.\d+)?[eE]|0\.0000)"
+    rb'|[{,]"-?(?:\d+(?:\.\d+)?[eE]-?\d+|0\.0000\d*)":'
+)
+
+
+def dumps(data):
+    """Serialize *data* to compact UTF-8 JSON bytes."""
+    if orjson is None:
+        return JSONRenderer().render(data)
+    try:
+        content = orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+    except orjson.JSONEncodeError:
+        return JSONRenderer().render(data)
+    if _FLOAT_MISMATCH.search(content):
+        return JSONRenderer().render(data)
+    # Keep the output a strict JavaScript subset, like JSONRenderer.
+    if b"\xe2\x80\xa8" in content or b"\xe2\x80\xa9" in content:
+        content = content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+    return content
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
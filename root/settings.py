@@ -35,8 +35,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'root.middleware.CompressionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'root.middleware.SecurityHeadersMiddleware',
+    'root.media.MediaFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware', 
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -119,7 +121,7 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 STORAGES = {
     "default": {
-        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "BACKEND": "root.storage.ContentAddressedStorage",
     },
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
@@ -129,7 +131,62 @@ STORAGES = {
 WHITENOISE_USE_FINDERS = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-
+# Serve MEDIA_URL from MEDIA_ROOT in-process (root.media); turn off when a
+# web server or CDN in front handles it.
+SERVE_MEDIA = os.getenv("SERVE_MEDIA", "True").lower() in ("1", "true", "yes")
+# Cache lifetime of media that isn't content-addressed; blobs are immutable.
+MEDIA_CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", str(60 * 60)))
+
+# Responsive image derivatives (root.images).
+IMAGE_DERIVATIVE_WIDTHS = tuple(
+    int(width) for width in os.getenv("IMAGE_DERIVATIVE_WIDTHS", "160,320,640,1280").split(",")
+)
+IMAGE_DERIVATIVE_FORMATS = tuple(os.getenv("IMAGE_DERIVATIVE_FORMATS", "avif,webp,jpeg").split(","))
+IMAGE_DERIVATIVE_WORKERS = int(os.getenv("IMAGE_DERIVATIVE_WORKERS", "2"))
+
+
+# Catalog response cache. Local memory is per process: generation bumps
+# from management commands, the shell or other workers never reach it, so
+# cached responses there are only kept for a minute by default. Set
+# DJANGO_CACHE_DIR to a directory every process shares to see changes at
+# once and keep responses for a day.
+CACHE_DIR = os.getenv("DJANGO_CACHE_DIR")
+SHARED_CACHE_TIMEOUT = 60 * 60 * 24 if CACHE_DIR else 60
+CACHES = {
+    "default": {
+        "BACKEND": (
+            "django.core.cache.backends.filebased.FileBasedCache"
+            if CACHE_DIR
+            else "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": CACHE_DIR or "ecommerce",
+    },
+    # Rendered item detail pages. Deliberately per-process: entries are
+    # checked against item versions kept in the default cache.
+    "items": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "shop-items",
+        "TIMEOUT": int(os.getenv("SHOP_ITEM_CACHE_TIMEOUT", str(min(60 * 10, SHARED_CACHE_TIMEOUT)))),
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("SHOP_ITEM_CACHE_MAX_ENTRIES", "10000"))},
+    },
+}
+SHOP_RESPONSE_CACHE_TIMEOUT = int(os.getenv("SHOP_RESPONSE_CACHE_TIMEOUT", str(SHARED_CACHE_TIMEOUT)))
+SHOP_ITEM_MISSING_TIMEOUT = int(os.getenv("SHOP_ITEM_MISSING_TIMEOUT", "60"))
+# Seconds before a process rebuilds its facet index (shop.facets) in full.
+SHOP_FACET_INDEX_TTL = int(os.getenv("SHOP_FACET_INDEX_TTL", str(SHARED_CACHE_TIMEOUT)))
+# Seconds a process keeps a reference table (shop.reference) between reloads.
+SHOP_REFERENCE_TTL = int(os.getenv("SHOP_REFERENCE_TTL", "60"))
+
+# Added to every order's subtotal (shop.models.OrderQuerySet.with_totals).
+SHOP_DELIVERY_CHARGE = os.getenv("SHOP_DELIVERY_CHARGE", "80")
+
+# API response compression (root.middleware.CompressionMiddleware).
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "1024"))
+RESPONSE_COMPRESSION_LEVELS = {
+    "br": int(os.getenv("RESPONSE_COMPRESSION_BROTLI_LEVEL", "4")),
+    "zstd": int(os.getenv("RESPONSE_COMPRESSION_ZSTD_LEVEL", "3")),
+    "gzip": int(os.getenv("RESPONSE_COMPRESSION_GZIP_LEVEL", "6")),
+}
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'Accounts.CustomUserModel'
@@ -142,7 +199,16 @@ REST_FRAMEWORK = {
     ], 
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'root.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'root.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 SIMPLE_JWT = {
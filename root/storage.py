@@ -0,0 +1,160 @@
+"""
+Content-addressed media storage.
+
+Uploads are stored under the SHA-256 of their bytes instead of the name they
+were uploaded with: ``watch.jpg`` becomes ``blobs/3f/3fa9…c1.jpg``. Uploading
+the same bytes again returns the existing name without writing anything, and
+since a name can never point at different content its URL is safe to cache
+forever.
+
+Files derived from a stored name, such as responsive derivatives
+(``blobs/3f/3fa9…c1.320w.webp``, see ``root.images``), are written under
+the name they are given with ``save_derived``. Blobs are never deleted when a row stops using them, as
+other rows may share them; ``manage.py gc_media_blobs`` removes the ones
+nothing references.
+
+Blobs of compressible types (SVG, JSON, text) get ``.br`` and ``.gz``
+sidecars written once at upload, which ``root.media`` serves to clients
+that accept them.
+"""
+
+import hashlib
+import mimetypes
+import os
+import re
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.base import ContentFile
+from django.core.files.utils import validate_file_name
+
+from .middleware import COMPRESSIBLE_TYPES, ENCODERS
+
+BLOB_PREFIX = "blobs"
+# Encoding -> suffix of the precompressed copy stored beside a compressible blob.
+SIDECARS = {encoding: suffix for encoding, suffix in (("br", ".br"), ("gzip", ".gz")) if encoding in ENCODERS}
+SIDECAR_LEVELS = {"br": 11, "gzip": 9}
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}(?=\.|$)")
+
+
+def content_digest(content):
+    """Hex SHA-256 of a Django ``File``, leaving it rewound."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def blob_digest(name):
+    """Digest a content-addressed name (or one of its derivatives) is keyed by, or ``None``."""
+    head, _, basename = (name or "").replace("\\", "/").rpartition("/")
+    if not head.startswith(f"{BLOB_PREFIX}/"):
+        return None
+    match = _DIGEST.match(basename)
+    return match.group(0) if match else None
+
+
+def is_compressible(name):
+    content_type = mimetypes.guess_type(name)[0] or ""
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def blob_name(self, digest, ext):
+        return f"{BLOB_PREFIX}/{digest[:2]}/{digest}{ext.lower()}"
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = self.blob_name(content_digest(content), os.path.splitext(name)[1])
+        validate_file_name(name, allow_relative_path=True)
+        return self._save(name, content)
+
+    def save_derived(self, name, content):
+        """Write *content* under *name* as given, replacing any existing file."""
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        validate_file_name(name, allow_relative_path=True)
+        return self._write(name, content)
+
+    def _save(self, name, content):
+        if self._touch(name):
+            # Same name, same bytes: nothing to write.
+            return name
+        name = self._write(name, content)
+        if is_compressible(name):
+            self._write_sidecars(name, content)
+        return name
+
+    def _touch(self, name):
+        """
+        Mark an existing file (and its sidecars) as just saved; ``False`` if it doesn't exist.
+
+        gc_media_blobs spares recently modified files, so a blob an upload
+        is reusing must look new until the upload's row is committed.
+        """
+        full_path = self.path(name)
+        try:
+            os.utime(full_path)
+        except FileNotFoundError:
+            return False
+        for suffix in SIDECARS.values():
+            try:
+                os.utime(full_path + suffix)
+            except FileNotFoundError:
+                pass
+        return True
+
+    def _write_sidecars(self, name, content):
+        data = b"".join(
+            chunk if isinstance(chunk, bytes) else chunk.encode() for chunk in content.chunks()
+        )
+        for encoding, suffix in SIDECARS.items():
+            compressed = ENCODERS[encoding](data, SIDECAR_LEVELS[encoding])
+            if len(compressed) < len(data):
+                self._write(name + suffix, ContentFile(compressed))
+
+    def _write(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(directory, self.directory_permissions_mode)
+
+        # Write beside the target and rename over it, so concurrent uploads of
+        # the same bytes and readers of a derivative being regenerated never
+        # see a partial file.
+        temp_path = f"{full_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "wb") as fh:
+                for chunk in content.chunks():
+                    fh.write(chunk if isinstance(chunk, bytes) else chunk.encode())
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, full_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from content, so an existing file is the same file.
+        return name
+
+
+def store_existing(storage, name):
+    """
+    Copy the file at *name* into its content address and return the new name.
+
+    Names that are already content-addressed, or whose file is missing, are
+    returned unchanged. The original file is left in place.
+    """
+    if not name or blob_digest(name) is not None or not storage.exists(name):
+        return name
+    with storage.open(name, "rb") as fh:
+        return storage.save(name, File(fh, name))
@@ -3,8 +3,6 @@ from django.urls import include, path, re_path
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
-from django.conf import settings
-from django.conf.urls.static import static
 
 from django.views.decorators.csrf import csrf_exempt
 
@@ -30,7 +28,6 @@ urlpatterns = [
     
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# MEDIA_URL is served by root.media.MediaFilesMiddleware.
 
     
\ No newline at end of file
@@ -4,35 +4,47 @@ from .models import (
     ContactMessage, Districts, Category, ItemType, Order, Size, Rating, Color,
     Item, ItemImage, ItemSize, ItemColor, Cart, Slider, BillingAddress, Payment, Coupon, Refund
 )
+from root.images import thumbnail_url
+
+from .reference import REFERENCE_MODELS, get_reference, reference_choices
 
 admin.site.site_header = 'Wellcome to Ecom Admin Panel'
 admin.site.index_title = 'Ecom Admin Panel'
 
+class ReferenceChoicesMixin:
+    """Fill reference-table selects from shop.reference, not a query per select."""
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if formfield is not None and db_field.related_model in REFERENCE_MODELS:
+            formfield.choices = reference_choices(db_field.related_model, formfield.empty_label)
+        return formfield
+
 # Inline Admin Models
 class ItemImageInline(admin.TabularInline):
     model = ItemImage
     extra = 1
 
-class ItemSizeInline(admin.TabularInline):
+class ItemSizeInline(ReferenceChoicesMixin, admin.TabularInline):
     model = ItemSize
     extra = 1
 
-class ItemColorInline(admin.TabularInline):
+class ItemColorInline(ReferenceChoicesMixin, admin.TabularInline):
     model = ItemColor
     extra = 1
 
-class ItemAdmin(admin.ModelAdmin):
+class ItemAdmin(ReferenceChoicesMixin, admin.ModelAdmin):
     inlines = [ItemImageInline, ItemSizeInline, ItemColorInline]
     list_display = [
         "product_id",
         "title",
-        "ratings",
+        "get_ratings",
         "price",
         "number_of_items",
         "discount_price",
         "brand_name",
-        "category",
-        "type",
+        "get_category",
+        "get_type",
         "get_first_image_url",
         "description",
         "is_featured",
@@ -41,11 +53,30 @@ class ItemAdmin(admin.ModelAdmin):
     def get_first_image_url(self, obj):
         first_image = obj.images.first()
         if first_image:
-            return format_html('<img src="{}" width="50" height="50" />'.format(first_image.image.url))
+            return format_html('<img src="{}" width="50" height="50" />', thumbnail_url(first_image.image))
         return None
 
     get_first_image_url.short_description = 'First Image'
 
+    # Reference columns come from shop.reference instead of a query per row.
+    def get_ratings(self, obj):
+        return get_reference(Rating, obj.ratings_id)
+
+    get_ratings.short_description = 'Ratings'
+    get_ratings.admin_order_field = 'ratings'
+
+    def get_category(self, obj):
+        return get_reference(Category, obj.category_id)
+
+    get_category.short_description = 'Category'
+    get_category.admin_order_field = 'category'
+
+    def get_type(self, obj):
+        return get_reference(ItemType, obj.type_id)
+
+    get_type.short_description = 'Type'
+    get_type.admin_order_field = 'type'
+
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name']
 
@@ -100,9 +131,24 @@ class OrderItemInline(admin.TabularInline):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'first_name', 'last_name', 'created_at', 'total_price')
+    list_display = ('id', 'first_name', 'last_name', 'created_at', 'item_count', 'total_price')
     inlines = [OrderItemInline]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_totals()
+
+    def item_count(self, obj):
+        return obj.item_count
+
+    item_count.short_description = 'Items'
+    item_count.admin_order_field = 'item_count'
+
+    def total_price(self, obj):
+        return obj.grand_total
+
+    total_price.short_description = 'Total price'
+    total_price.admin_order_field = 'grand_total'
+
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('order', 'quantity', 'price', 'color', 'size')
@@ -0,0 +1,352 @@
+"""
+Versioned response cache and conditional GET support for the catalog.
+
+Every cached model has a generation counter in the Django cache. A cached
+response is stored under a key that includes the current generation of each
+model it was built from, so bumping a counter (see ``shop.signals``) makes all
+dependent responses unreachable without having to find and delete them.
+
+The same counters give every catalog response a strong ETag and a
+Last-Modified date without running the queryset or the serializer.
+
+Item detail pages additionally get a per-item cache (``ItemDetailCacheMixin``)
+so that editing one item doesn't invalidate every other product page.
+
+Only cache primitives that the local-memory and file-based backends support
+(get/get_many/add/set/set_many/incr) are used, so no Redis is required.
+"""
+
+import hashlib
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+ITEM_EPOCH_KEY = "shop:item:epoch"
+
+
+def get_cache():
+    return caches[getattr(settings, "SHOP_CACHE_ALIAS", "default")]
+
+
+def get_item_cache():
+    """The per-process LRU cache holding rendered item detail responses."""
+    return caches[getattr(settings, "SHOP_ITEM_CACHE_ALIAS", "items")]
+
+
+def _generation_key(model):
+    return f"shop:gen:{model._meta.label_lower}"
+
+
+def _modified_key(model):
+    return f"shop:modified:{model._meta.label_lower}"
+
+
+def _new_generation():
+    # Seed counters from the clock rather than 1, so a counter that was
+    # evicted never comes back at a value an older response was stored under.
+    return int(time.time() * 1000)
+
+
+def get_generations(models):
+    """Return ``{model_label: generation}`` for *models* in one cache round-trip."""
+    cache = get_cache()
+    keys = {_generation_key(model): model for model in models}
+    found = cache.get_many(list(keys))
+
+    generations = {}
+    for key, model in keys.items():
+        value = found.get(key)
+        if value is None:
+            cache.add(_modified_key(model), time.time(), timeout=None)
+            cache.add(key, _new_generation(), timeout=None)
+            value = cache.get(key)
+        generations[model._meta.label_lower] = value
+    return generations
+
+
+def catalog_version(models):
+    """Return a short hash that changes whenever any of *models* changes."""
+    generations = get_generations(models)
+    raw = "|".join(f"{label}={value}" for label, value in sorted(generations.items()))
+    return hashlib.md5(raw.encode()).hexdigest()[:16]
+
+
+def get_last_modified(models):
+    """Return the latest bump time of *models* as a Unix timestamp, or ``None``."""
+    found = get_cache().get_many([_modified_key(model) for model in models])
+    return max(found.values()) if found else None
+
+
+def bump_generation(model):
+    cache = get_cache()
+    key = _generation_key(model)
+    cache.set(_modified_key(model), time.time(), timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_generation(), timeout=None)
+
+
+def _item_version_key(pk):
+    return f"shop:item:version:{pk}"
+
+
+def get_item_version(pk):
+    """Return the current version of item *pk* as stored in the shared cache."""
+    cache = get_cache()
+    keys = [ITEM_EPOCH_KEY, _item_version_key(pk)]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # A fresh token, so entries stored under an evicted version never
+            # become valid again.
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            found[key] = cache.get(key)
+    return tuple(found[key] for key in keys)
+
+
+def invalidate_item_details(item_ids=None):
+    """Expire cached detail responses of *item_ids* (every item when ``None``)."""
+    cache = get_cache()
+    token = uuid.uuid4().hex
+    if item_ids is None:
+        cache.set(ITEM_EPOCH_KEY, token, timeout=None)
+    else:
+        cache.set_many({_item_version_key(pk): token for pk in item_ids}, timeout=None)
+
+
+# Hit and miss counts of this process. Kept out of the shared cache so a hit
+# costs no cache write (a read-modify-write and a cull on FileBasedCache).
+_counters = Counter()
+_counters_lock = threading.Lock()
+
+
+def _count(key):
+    with _counters_lock:
+        _counters[key] += 1
+
+
+def cache_stats():
+    """Hit and miss counts of this process since it started."""
+    with _counters_lock:
+        hits, misses = _counters["hits"], _counters["misses"]
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else 0.0,
+    }
+
+
+class CompressedVariants:
+    """
+    Compressed copies of a cached response body, for ``CompressionMiddleware``.
+
+    Each encoding is stored next to the response under ``<key>:<encoding>``
+    together with *tag*; a copy whose tag differs from the response's is
+    ignored, so it can't outlive the body it was made from.
+    """
+
+    def __init__(self, cache, key, tag=None, timeout=None):
+        self.cache = cache
+        self.key = key
+        self.tag = tag
+        self.timeout = timeout
+
+    def get(self, encoding):
+        stored = self.cache.get(f"{self.key}:{encoding}")
+        if stored is not None and stored[0] == self.tag:
+            return stored[1]
+        return None
+
+    def set(self, encoding, content):
+        self.cache.set(f"{self.key}:{encoding}", (self.tag, content), timeout=self.timeout)
+
+
+class CatalogVersionMixin:
+    """
+    Identify a response by the request and the generations of ``cache_models``.
+
+    ``cache_models`` lists every model the response is built from; saving or
+    deleting any of them changes the fingerprint.
+    """
+
+    cache_models = ()
+
+    def get_response_fingerprint(self, request):
+        fingerprint = getattr(request, "_shop_fingerprint", None)
+        if fingerprint is None:
+            generations = get_generations(self.cache_models)
+            raw = "|".join([
+                type(self).__name__,
+                request.get_host(),
+                request.get_full_path(),
+                request.META.get("HTTP_ACCEPT", ""),
+                *(f"{label}={value}" for label, value in sorted(generations.items())),
+            ])
+            fingerprint = request._shop_fingerprint = hashlib.md5(raw.encode()).hexdigest()
+        return fingerprint
+
+
+class ConditionalGetMixin(CatalogVersionMixin):
+    """
+    Answer ``If-None-Match``/``If-Modified-Since`` with a 304 before the view runs.
+
+    The ETag is the response fingerprint, so it is known without touching the
+    queryset or the serializer.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or not self.cache_models:
+            return super().dispatch(request, *args, **kwargs)
+
+        etag = f'"{self.get_response_fingerprint(request)}"'
+        last_modified = get_last_modified(self.cache_models)
+        headers = {"ETag": etag, "Vary": "Accept"}
+        if last_modified is not None:
+            headers["Last-Modified"] = http_date(last_modified)
+
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified and int(last_modified)
+        )
+        if not_modified is not None:
+            for header, value in headers.items():
+                not_modified[header] = value
+            return not_modified
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            for header, value in headers.items():
+                response.headers.setdefault(header, value)
+        return response
+
+
+class CachedResponseMixin(CatalogVersionMixin):
+    """
+    Serve GET requests from the rendered bytes of an earlier identical request.
+
+    Only successful JSON responses are stored, so the browsable API and
+    errors always go through the view.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != "GET" or not self.cache_models:
+            return super().dispatch(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = "shop:response:" + self.get_response_fingerprint(request)
+        timeout = getattr(settings, "SHOP_RESPONSE_CACHE_TIMEOUT", 60 * 60 * 24)
+        cached = cache.get(key)
+        if cached is not None:
+            _count("hits")
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response["Vary"] = "Accept"
+            response["X-Cache"] = "HIT"
+            # The fingerprint already covers every input, so a key's body
+            # never changes and its compressed copies need no tag.
+            response.compressed_variants = CompressedVariants(cache, key, timeout=timeout)
+            return response
+
+        _count("misses")
+        response = super().dispatch(request, *args, **kwargs)
+        renderer = getattr(response, "accepted_renderer", None)
+        if response.status_code == 200 and renderer is not None and renderer.format == "json":
+            response.render()
+            cache.set(key, (response.content, response["Content-Type"]), timeout=timeout)
+            response.compressed_variants = CompressedVariants(cache, key, timeout=timeout)
+        response["X-Cache"] = "MISS"
+        return response
+
+
+class ItemDetailCacheMixin(CatalogVersionMixin):
+    """
+    Serve item detail GETs from a bounded per-process cache.
+
+    Rendered responses are kept in the ``items`` cache alias (an LRU with a
+    TTL) together with the item's version from the shared cache; a response
+    is only reused while that version is unchanged, so saving an item (see
+    ``invalidate_item_details``) drops just that item's entries. Lookups
+    that found nothing are remembered for ``SHOP_ITEM_MISSING_TIMEOUT``
+    seconds, or until ``cache_models`` change, and answered with a 404
+    without touching the database.
+
+    Views implement ``get_item_lookup`` and ``resolve_item_pk``.
+    """
+
+    def get_item_lookup(self, kwargs):
+        """Return the ``(field, value)`` the item is looked up by."""
+        raise NotImplementedError
+
+    def resolve_item_pk(self, field, value):
+        """Return the primary key for the lookup, or ``None`` if there is no such item."""
+        raise NotImplementedError
+
+    def get_object(self):
+        if getattr(self, "_item_missing", False):
+            raise Http404
+        return super().get_object()
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != "GET":
+            return super().dispatch(request, *args, **kwargs)
+
+        field, value = self.get_item_lookup(kwargs)
+        lookup = hashlib.md5(f"{field}|{value}".encode()).hexdigest()
+        variant = hashlib.md5("|".join([
+            request.get_host(),
+            request.get_full_path(),
+            request.META.get("HTTP_ACCEPT", ""),
+        ]).encode()).hexdigest()
+        detail_key = f"shop:item:detail:{lookup}:{variant}"
+        missing_key = f"shop:item:missing:{lookup}"
+
+        local = get_item_cache()
+        found = local.get_many([detail_key, missing_key])
+        if missing_key in found and found[missing_key] == get_generations(self.cache_models):
+            _count("hits")
+            self._item_missing = True
+            response = super().dispatch(request, *args, **kwargs)
+            response["X-Cache"] = "HIT"
+            return response
+
+        entry = found.get(detail_key)
+        if entry is not None:
+            pk, version, content, content_type = entry
+            if get_item_version(pk) == version:
+                _count("hits")
+                response = HttpResponse(content, content_type=content_type)
+                response["Vary"] = "Accept"
+                response["X-Cache"] = "HIT"
+                response.compressed_variants = CompressedVariants(local, detail_key, tag=version)
+                return response
+
+        _count("misses")
+        # Versions are read before the database so that a change committed
+        # while the response is built invalidates it rather than being hidden.
+        generations = get_generations(self.cache_models)
+        pk = self.resolve_item_pk(field, value)
+        version = get_item_version(pk) if pk is not None else None
+        self._item_missing = pk is None
+
+        response = super().dispatch(request, *args, **kwargs)
+        renderer = getattr(response, "accepted_renderer", None)
+        if response.status_code == 404:
+            local.set(
+                missing_key,
+                generations,
+                timeout=getattr(settings, "SHOP_ITEM_MISSING_TIMEOUT", 60),
+            )
+        elif response.status_code == 200 and renderer is not None and renderer.format == "json":
+            response.render()
+            local.set(detail_key, (pk, version, response.content, response["Content-Type"]))
+            response.compressed_variants = CompressedVariants(local, detail_key, tag=version)
+        response["X-Cache"] = "MISS"
+        return response
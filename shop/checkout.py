@@ -0,0 +1,65 @@
+"""
+Server-side checkout.
+
+``checkout`` turns a user's open cart into an ``Order`` in one transaction.
+Every line is priced here, never by the client: the item's size price when
+the item has the cart's size, otherwise its ``discount_price``. The order
+items are written with one ``bulk_create`` and the cart rows are closed with
+one UPDATE, so a checkout costs the same handful of queries however many
+lines the cart has.
+"""
+
+from django.db import transaction
+
+from .models import Cart, ItemSize, Order, OrderItem
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def price_lines(carts):
+    """Return the unit price of each cart row, in order."""
+    size_prices = {
+        (item_id, size): price
+        for item_id, size, price in ItemSize.objects.filter(
+            item__in={cart.item_id for cart in carts}
+        ).values_list("item_id", "size__name", "price_for_this_size")
+    }
+    return [
+        size_prices.get((cart.item_id, cart.item_size), cart.item.discount_price)
+        for cart in carts
+    ]
+
+
+def checkout(user, **order_fields):
+    """Create an order from *user*'s open cart and mark the cart rows ordered."""
+    with transaction.atomic():
+        carts = list(
+            Cart.objects.select_for_update(of=("self",))
+            .filter(user_name=user, ordered=False)
+            .select_related("item")
+            .order_by("pk")
+        )
+        if not carts:
+            raise CheckoutError("Your cart is empty.")
+        if any(cart.quantity < 1 for cart in carts):
+            raise CheckoutError("Cart quantities must be at least 1.")
+
+        order = Order.objects.create(user=user, ordered=True, **order_fields)
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order,
+                product=cart.item.product_id,
+                quantity=cart.quantity,
+                price=price,
+                color=cart.item_color_code,
+                size=cart.item_size,
+            )
+            for cart, price in zip(carts, price_lines(carts))
+        )
+        closed = Cart.objects.filter(pk__in=[cart.pk for cart in carts], ordered=False).update(ordered=True)
+        if closed != len(carts):
+            # Another checkout got to some of these rows first; undo ours.
+            raise CheckoutError("Your cart changed during checkout, please try again.")
+    return order
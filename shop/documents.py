@@ -0,0 +1,85 @@
+"""
+Materialized item documents.
+
+``Item.document`` holds the full nested ``ItemSerilizers`` representation of
+an item, so list and detail endpoints can return it without touching the
+image/size/color tables. Documents are stored with relative media URLs and
+made absolute per request by ``ItemDocumentSerializer``.
+"""
+
+from django.db import transaction
+
+from .cache import bump_generation, invalidate_item_details
+from .fastpath import compile_serializer
+from .models import Item
+from .serializers import ItemSerilizers
+
+DOCUMENT_PREFETCH = ("images", "item_size__size", "item_color__color", "colors")
+
+
+def build_item_document(item):
+    return ItemSerilizers(item).data
+
+
+def rebuild_item_documents(item_ids=None, batch_size=500):
+    """
+    Rebuild the stored document for *item_ids* (every item when ``None``).
+
+    Items are walked in primary-key batches; each batch is serialized by the
+    compiled ``ItemSerilizers`` plan and written back with one
+    ``bulk_update``. Returns the number of documents written.
+    """
+    compiled = compile_serializer(ItemSerilizers)
+    queryset = Item.objects.order_by("pk")
+    if item_ids is not None:
+        item_ids = list(item_ids)
+        queryset = queryset.filter(pk__in=item_ids)
+
+    written = 0
+    last_pk = 0
+    while True:
+        documents = compiled.serialize_queryset(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not documents:
+            break
+        Item.objects.bulk_update(
+            [Item(pk=document["id"], document=document) for document in documents],
+            ["document"],
+        )
+        written += len(documents)
+        last_pk = documents[-1]["id"]
+
+    # bulk_update skips post_save, so invalidate cached item responses here;
+    # otherwise a response built from the old document could outlive it.
+    if written:
+        bump_generation(Item)
+        invalidate_item_details(item_ids)
+    return written
+
+
+def _rebuild_pending(connection):
+    item_ids = connection.__dict__.pop("_pending_item_rebuild", None)
+    if item_ids:
+        rebuild_item_documents(item_ids)
+
+
+def schedule_item_document_rebuild(item_ids):
+    """
+    Rebuild documents once the current transaction commits.
+
+    Ids scheduled in the same transaction are collected on the connection
+    and the first callback to run rebuilds them all, so saving an item and
+    its images rebuilds its document once. Every call registers its own
+    callback, so ids scheduled in a savepoint that is rolled back are still
+    picked up by the callbacks that survive it.
+    """
+    item_ids = set(item_ids)
+    if not item_ids:
+        return
+    connection = transaction.get_connection()
+    pending = connection.__dict__.setdefault("_pending_item_rebuild", set())
+    pending |= item_ids
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _rebuild_pending(connection))
+    else:
+        # Also takes ids left over from a transaction that was rolled back.
+        _rebuild_pending(connection)
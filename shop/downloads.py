@@ -0,0 +1,146 @@
+"""
+Concurrent image downloads for the catalog importers.
+
+``ImageDownloader`` fetches on a bounded thread pool through one pooled
+``requests.Session``, allows at most ``per_host`` requests to the same host
+at a time, and retries connection errors, 429 and 5xx responses with
+exponential backoff and full jitter (honouring a numeric ``Retry-After``).
+Plain paths are read from disk relative to ``source_dir`` and must
+resolve inside it, so imports can run offline. ``file://`` URLs may point
+anywhere and are only read with ``allow_local_files``; every other scheme
+is refused.
+
+Downloaded bytes go straight to the default storage from the worker thread;
+callers only get storage names back and keep all database work on their
+own thread. Fetching and storing are timed as the ``fetch`` and ``store``
+stages of *report* (see ``shop.stages``).
+"""
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+from urllib.request import url2pathname
+
+import requests
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from requests.adapters import HTTPAdapter
+
+from .stages import StageReport
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class DownloadError(Exception):
+    pass
+
+
+class ImageDownloader:
+    def __init__(self, workers=8, per_host=4, retries=3, backoff=0.5, max_backoff=30,
+                 timeout=30, source_dir=None, storage=None, report=None, allow_local_files=False):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.source_dir = os.path.realpath(source_dir or os.getcwd())
+        self.allow_local_files = allow_local_files
+        self.storage = storage or default_storage
+        self.report = report or StageReport("downloads")
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-download")
+
+        self.per_host = per_host
+        self._host_slots = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.session.close()
+
+    def _host_slot(self, host):
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return slot
+
+    def _delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+        if retry_after.isdigit():
+            return min(int(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _local_path(self, url):
+        parsed = urlparse(url)
+        if parsed.scheme == "file":
+            if not self.allow_local_files:
+                raise DownloadError(f"{url}: file:// URLs are not allowed")
+            return url2pathname(unquote(parsed.path))
+        if parsed.scheme:
+            raise DownloadError(f"{url}: unsupported URL scheme {parsed.scheme!r}")
+        path = os.path.realpath(os.path.join(self.source_dir, url))
+        if os.path.commonpath([path, self.source_dir]) != self.source_dir:
+            raise DownloadError(f"{url}: path is outside {self.source_dir}")
+        return path
+
+    def _read_local(self, url):
+        path = self._local_path(url)
+        try:
+            with open(path, "rb") as fh:
+                return fh.read()
+        except OSError as exc:
+            raise DownloadError(f"{url}: {exc}") from exc
+
+    def _fetch_http(self, url):
+        slot = self._host_slot(urlparse(url).netloc)
+        for attempt in range(self.retries + 1):
+            response = None
+            with slot:
+                try:
+                    response = self.session.get(url, timeout=self.timeout)
+                except (requests.ConnectionError, requests.Timeout) as exc:
+                    error = exc
+                else:
+                    if response.status_code not in RETRY_STATUSES:
+                        try:
+                            response.raise_for_status()
+                        except requests.HTTPError as exc:
+                            raise DownloadError(f"{url}: {exc}") from exc
+                        return response.content
+                    error = f"HTTP {response.status_code}"
+            # Sleep outside the slot so other requests to the host can go.
+            if attempt < self.retries:
+                time.sleep(self._delay(attempt, response))
+        raise DownloadError(f"{url}: {error} after {self.retries + 1} attempts")
+
+    def fetch(self, url):
+        """Return the bytes at *url*, raising ``DownloadError`` on failure."""
+        if urlparse(url).scheme in ("http", "https"):
+            return self._fetch_http(url)
+        return self._read_local(url)
+
+    def _store(self, url, name):
+        with self.report.stage("fetch") as stage:
+            content = self.fetch(url)
+            stage.add(rows=1, bytes=len(content))
+        with self.report.stage("store") as stage:
+            name = self.storage.save(name, ContentFile(content))
+            stage.add(rows=1, bytes=len(content))
+        return name
+
+    def submit(self, url, name):
+        """Download *url* into storage as *name* in the background; the future yields the stored name."""
+        return self.executor.submit(self._store, url, name)
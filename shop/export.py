@@ -0,0 +1,86 @@
+"""
+Streaming catalog export.
+
+Items are read in primary-key chunks, so memory stays flat however large the
+catalog is. Each item is written from its stored document; only the items in
+a chunk that don't have one yet get their images/sizes/colors prefetched.
+Both the admin endpoint and the ``export_catalog`` command use these
+generators.
+"""
+
+import csv
+import json
+
+from django.db.models import prefetch_related_objects
+
+from .documents import DOCUMENT_PREFETCH, build_item_document
+from .models import Item
+from .serializers import rewrite_media_urls
+
+CSV_COLUMNS = (
+    "id", "product_id", "title", "brand_name", "price", "discount_price",
+    "number_of_items", "category", "type", "ratings", "is_featured",
+    "is_bestselling", "description", "image", "images", "sizes", "colors",
+)
+
+
+def iter_item_documents(chunk_size=1000, absolute=None):
+    """Yield every item document in primary-key order."""
+    last_pk = 0
+    while True:
+        chunk = list(Item.objects.filter(pk__gt=last_pk).order_by("pk")[:chunk_size])
+        if not chunk:
+            return
+        missing = [item for item in chunk if item.document is None]
+        if missing:
+            prefetch_related_objects(missing, *DOCUMENT_PREFETCH)
+        for item in chunk:
+            document = item.document if item.document is not None else build_item_document(item)
+            yield rewrite_media_urls(document, absolute) if absolute else document
+        last_pk = chunk[-1].pk
+
+
+def iter_ndjson(documents):
+    for document in documents:
+        yield json.dumps(document, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+class _LineBuffer:
+    """File-like object whose ``write`` hands the line back to ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(documents):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(CSV_COLUMNS)
+    for document in documents:
+        yield writer.writerow([
+            document["id"],
+            document["product_id"],
+            document["title"],
+            document["brand_name"],
+            document["price"],
+            document["discount_price"],
+            document["number_of_items"],
+            document["category"],
+            document["type"],
+            document["ratings"],
+            document["is_featured"],
+            document["is_bestselling"],
+            document["description"],
+            document["image"],
+            "|".join(image["image"] for image in document["images"] if image["image"]),
+            "|".join(
+                f"{entry['size']['name']}:{entry['price_for_this_size']}"
+                for entry in document["item_size"]
+            ),
+            "|".join(entry["color"]["name"] for entry in document["item_color"]),
+        ])
+
+
+EXPORT_FORMATS = {
+    "ndjson": (iter_ndjson, "application/x-ndjson"),
+    "csv": (iter_csv, "text/csv"),
+}
@@ -0,0 +1,375 @@
+"""
+Faceted filtering for the item catalog.
+
+Each process keeps a ``FacetIndex``: for every facet value a bitmap (a Python
+int with bit *n* set when item *n* has that value). Filtering is a handful of
+AND/OR operations and a facet count is one ``int.bit_count()``, so counts do
+not depend on GROUP BY queries over the join tables.
+
+Writes are recorded as a journal of changed item ids in the Django cache
+(see ``record_facet_change``). Before answering, every process replays the
+entries it has not seen by reloading just those items, and falls back to a
+full rebuild when the journal has gaps. The journal only reaches other
+processes through a shared cache, so an index is also rebuilt once it is
+``SHOP_FACET_INDEX_TTL`` seconds old. That rebuild runs in a background
+thread; requests keep getting the expired index until the new one is ready.
+
+A published index is never modified: changes are applied to a copy that
+then replaces it, so requests can read it without locking.
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from rest_framework.exceptions import ValidationError
+
+from .cache import get_cache
+from .models import Item, ItemColor, ItemSize
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ("category", "type", "rating", "color", "size", "is_featured", "is_bestselling")
+BOOLEAN_DIMENSIONS = ("is_featured", "is_bestselling")
+
+# Prices are also indexed, in buckets of this width. Buckets fully inside a
+# requested range come from their bitmaps; only the (at most two) partially
+# covered buckets are read from the (price, id) index.
+PRICE_BUCKET_WIDTH = 100
+
+SEQ_KEY = "shop:facets:seq"
+JOURNAL_TIMEOUT = 60 * 60 * 24
+# Past this many pending changes a full rebuild is cheaper than replaying.
+MAX_REPLAY = 1000
+
+TRUE_VALUES = {"1", "true", "yes", "on"}
+FALSE_VALUES = {"0", "false", "no", "off"}
+
+
+def _journal_key(seq):
+    return f"shop:facets:change:{seq}"
+
+
+def _price_bucket(price):
+    return price // PRICE_BUCKET_WIDTH * PRICE_BUCKET_WIDTH
+
+
+def _bitmap_from_ids(ids):
+    ids = list(ids)
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for item_id in ids:
+        buffer[item_id >> 3] |= 1 << (item_id & 7)
+    return int.from_bytes(buffer, "little")
+
+
+class _BitmapBuilder:
+    """Collects ids per (dimension, value) in bytearrays, then freezes them to ints."""
+
+    def __init__(self):
+        self.buffers = defaultdict(bytearray)
+
+    def add(self, dimension, value, item_id):
+        buffer = self.buffers[dimension, value]
+        index = item_id >> 3
+        if index >= len(buffer):
+            buffer.extend(bytes(index - len(buffer) + 1024))
+        buffer[index] |= 1 << (item_id & 7)
+
+    def bitmaps(self):
+        for (dimension, value), buffer in self.buffers.items():
+            yield dimension, value, int.from_bytes(buffer, "little")
+
+
+class FacetIndex:
+    def __init__(self):
+        self.seq = 0
+        self.built_at = time.monotonic()
+        self.all_items = 0
+        self.bitmaps = {dimension: defaultdict(int) for dimension in (*DIMENSIONS, "price")}
+        self._sizes = {}
+        self._price_bitmaps = {}
+
+    # ---- Loading ------------------------------------------------------
+
+    @staticmethod
+    def _load(item_ids=None):
+        items = Item.objects.all()
+        colors = ItemColor.objects.all()
+        sizes = ItemSize.objects.all()
+        if item_ids is not None:
+            items = items.filter(pk__in=item_ids)
+            colors = colors.filter(item_id__in=item_ids)
+            sizes = sizes.filter(item_id__in=item_ids)
+
+        builder = _BitmapBuilder()
+        rows = items.values_list(
+            "pk", "category_id", "type_id", "ratings_id", "is_featured", "is_bestselling", "price"
+        )
+        for pk, category, type_, rating, featured, bestselling, price in rows.iterator(chunk_size=5000):
+            builder.add("all", None, pk)
+            if category is not None:
+                builder.add("category", category, pk)
+            if type_ is not None:
+                builder.add("type", type_, pk)
+            if rating is not None:
+                builder.add("rating", rating, pk)
+            builder.add("is_featured", featured, pk)
+            builder.add("is_bestselling", bestselling, pk)
+            builder.add("price", _price_bucket(price), pk)
+        for item_id, color_id in colors.values_list("item_id", "color_id").iterator(chunk_size=5000):
+            builder.add("color", color_id, item_id)
+        for item_id, size_id in sizes.values_list("item_id", "size_id").iterator(chunk_size=5000):
+            builder.add("size", size_id, item_id)
+        return builder
+
+    def _merge(self, builder):
+        for dimension, value, bitmap in builder.bitmaps():
+            if dimension == "all":
+                self.all_items |= bitmap
+            else:
+                self.bitmaps[dimension][value] |= bitmap
+        # Colors and sizes of deleted items may still be loaded; drop them.
+        for by_value in self.bitmaps.values():
+            for value in by_value:
+                by_value[value] &= self.all_items
+        self._sizes.clear()
+        self._price_bitmaps.clear()
+
+    @classmethod
+    def build(cls, seq=0):
+        index = cls()
+        index.seq = seq
+        index._merge(cls._load())
+        return index
+
+    def copy(self):
+        """A copy that can be patched while this index is being read."""
+        index = FacetIndex()
+        index.seq = self.seq
+        index.built_at = self.built_at
+        index.all_items = self.all_items
+        index.bitmaps = {
+            dimension: defaultdict(int, by_value) for dimension, by_value in self.bitmaps.items()
+        }
+        return index
+
+    def reload_items(self, item_ids):
+        """Re-read *item_ids* from the database and patch their bits in place."""
+        mask = ~_bitmap_from_ids(item_ids)
+        self.all_items &= mask
+        for by_value in self.bitmaps.values():
+            for value in by_value:
+                by_value[value] &= mask
+        self._merge(self._load(set(item_ids)))
+
+    # ---- Queries ------------------------------------------------------
+
+    def price_bitmap(self, price_min, price_max):
+        key = (price_min, price_max)
+        if key in self._price_bitmaps:
+            return self._price_bitmaps[key]
+
+        low = price_min if price_min is not None else float("-inf")
+        high = price_max if price_max is not None else float("inf")
+        bitmap = 0
+        edges = Q(pk__in=[])
+        for bucket, bucket_bitmap in self.bitmaps["price"].items():
+            top = bucket + PRICE_BUCKET_WIDTH - 1
+            if low <= bucket and top <= high:
+                bitmap |= bucket_bitmap
+            elif bucket <= high and top >= low:
+                edges |= Q(price__gte=max(low, bucket), price__lte=min(high, top))
+        edge_ids = Item.objects.filter(edges).values_list("pk", flat=True)
+        bitmap |= _bitmap_from_ids(edge_ids) & self.all_items
+
+        if len(self._price_bitmaps) >= 64:
+            self._price_bitmaps.clear()
+        self._price_bitmaps[key] = bitmap
+        return bitmap
+
+    def filter_bitmap(self, filters, skip=None):
+        """Items matching *filters*, ignoring the *skip* dimension."""
+        bitmap = self.all_items
+        for dimension in DIMENSIONS:
+            values = filters.get(dimension)
+            if dimension == skip or not values:
+                continue
+            matched = 0
+            for value in values:
+                matched |= self.bitmaps[dimension].get(value, 0)
+            bitmap &= matched
+        has_price = filters.get("price_min") is not None or filters.get("price_max") is not None
+        if skip != "price" and has_price:
+            bitmap &= self.price_bitmap(filters.get("price_min"), filters.get("price_max"))
+        return bitmap
+
+    def counts(self, filters):
+        """
+        Per-dimension counts under *filters*.
+
+        Each dimension is counted against the other dimensions' filters only,
+        so choosing one category still shows how many items the others have.
+        ``price`` counts items per ``PRICE_BUCKET_WIDTH`` bucket, keyed by the
+        bucket's lowest price.
+        """
+        facets = {}
+        for dimension in (*DIMENSIONS, "price"):
+            base = self.filter_bitmap(filters, skip=dimension)
+            counts = []
+            for value, bitmap in self.bitmaps[dimension].items():
+                if base is self.all_items:
+                    # Unfiltered popcounts only change when the index does.
+                    key = (dimension, value)
+                    if key not in self._sizes:
+                        self._sizes[key] = bitmap.bit_count()
+                    count = self._sizes[key]
+                else:
+                    count = (base & bitmap).bit_count() if base else 0
+                if count:
+                    counts.append({"value": value, "count": count})
+            facets[dimension] = sorted(counts, key=lambda entry: entry["value"])
+        facets["total"] = self.filter_bitmap(filters).bit_count()
+        return facets
+
+
+_index = None
+_lock = threading.Lock()
+_rebuild_thread = None
+
+
+def _is_expired(index):
+    return time.monotonic() - index.built_at >= getattr(settings, "SHOP_FACET_INDEX_TTL", 60)
+
+
+def _rebuild(seq):
+    global _index
+    try:
+        index = FacetIndex.build(seq)
+        with _lock:
+            # Changes journaled after *seq* are replayed by the next request.
+            if _index is None or _index.built_at < index.built_at:
+                _index = index
+    except Exception:
+        logger.exception("Rebuilding the facet index failed")
+    finally:
+        connection.close()
+
+
+def get_facet_index():
+    """Return this process's index, caught up with the shared change journal."""
+    global _index, _rebuild_thread
+    cache = get_cache()
+    seq = cache.get(SEQ_KEY, 0)
+    index = _index
+    if index is not None and index.seq == seq and not _is_expired(index):
+        return index
+
+    with _lock:
+        index = _index
+        if index is not None and index.seq == seq:
+            if _is_expired(index) and not (_rebuild_thread and _rebuild_thread.is_alive()):
+                _rebuild_thread = threading.Thread(
+                    target=_rebuild, args=(seq,), name="facet-index-rebuild", daemon=True,
+                )
+                _rebuild_thread.start()
+            return index
+        changed = None
+        if index is not None and 0 < seq - index.seq <= MAX_REPLAY:
+            found = cache.get_many([_journal_key(n) for n in range(index.seq + 1, seq + 1)])
+            if len(found) == seq - index.seq:
+                changed = {item_id for ids in found.values() for item_id in ids}
+        if changed is None:
+            index = FacetIndex.build(seq)
+        else:
+            index = index.copy()
+            index.reload_items(changed)
+            index.seq = seq
+        _index = index
+        return index
+
+
+def record_facet_change(item_ids):
+    """Journal *item_ids* for every process once the transaction commits."""
+    item_ids = list(set(item_ids))
+    if not item_ids:
+        return
+
+    def record():
+        cache = get_cache()
+        cache.add(SEQ_KEY, 0, timeout=None)
+        seq = cache.incr(SEQ_KEY)
+        cache.set(_journal_key(seq), item_ids, timeout=JOURNAL_TIMEOUT)
+
+    transaction.on_commit(record)
+
+
+# ---- Request parsing and database filtering ---------------------------
+
+def parse_facet_filters(params):
+    """Read facet filters from query params; raise ``ValidationError`` on bad input."""
+    filters = {}
+    errors = {}
+    for dimension in DIMENSIONS:
+        raw = params.get(dimension)
+        if raw is None or raw == "":
+            continue
+        values = set()
+        for part in raw.split(","):
+            part = part.strip().lower()
+            if dimension in BOOLEAN_DIMENSIONS:
+                if part in TRUE_VALUES:
+                    values.add(True)
+                elif part in FALSE_VALUES:
+                    values.add(False)
+                else:
+                    errors[dimension] = ["Must be true or false."]
+            elif part.isdigit():
+                values.add(int(part))
+            else:
+                errors[dimension] = ["Must be a comma-separated list of ids."]
+        filters[dimension] = values
+
+    for bound in ("price_min", "price_max"):
+        raw = params.get(bound)
+        if raw is None or raw == "":
+            continue
+        try:
+            filters[bound] = int(raw)
+        except ValueError:
+            errors[bound] = ["Must be an integer."]
+
+    if errors:
+        raise ValidationError(errors)
+    return filters
+
+
+def apply_facet_filters(queryset, filters):
+    lookups = {
+        "category": "category_id__in",
+        "type": "type_id__in",
+        "rating": "ratings_id__in",
+        "is_featured": "is_featured__in",
+        "is_bestselling": "is_bestselling__in",
+    }
+    for dimension, lookup in lookups.items():
+        if filters.get(dimension):
+            queryset = queryset.filter(**{lookup: filters[dimension]})
+    if filters.get("color"):
+        queryset = queryset.filter(Exists(ItemColor.objects.filter(
+            item=OuterRef("pk"), color_id__in=filters["color"],
+        )))
+    if filters.get("size"):
+        queryset = queryset.filter(Exists(ItemSize.objects.filter(
+            item=OuterRef("pk"), size_id__in=filters["size"],
+        )))
+    if filters.get("price_min") is not None:
+        queryset = queryset.filter(price__gte=filters["price_min"])
+    if filters.get("price_max") is not None:
+        queryset = queryset.filter(price__lte=filters["price_max"])
+    return queryset
@@ -0,0 +1,166 @@
+"""
+Compiled read-only serializers for hot item reads.
+
+``CompiledSerializer`` walks a ``ModelSerializer``'s fields once and turns
+them into a flat list of ``.values()`` columns plus a plan for building each
+output dict. Serializing a page is then one ``values()`` query for the rows,
+one per nested many-relation, and plain dict construction, with no DRF field
+machinery per row. The output matches the source serializer exactly (see
+``shop/tests.py``). Field types the compiler doesn't know raise
+``ImproperlyConfigured``, so a serializer change can't silently diverge.
+"""
+
+from collections import defaultdict
+from functools import lru_cache
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+
+from root.images import ImageSrcsetField, srcset_map
+
+# DRF fields whose representation of a database value is the value itself.
+PASSTHROUGH_FIELDS = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.BooleanField,
+)
+
+
+class CompiledSerializer:
+    def __init__(self, serializer_class, fields=None, prefix=""):
+        serializer = serializer_class(fields=fields) if fields is not None else serializer_class()
+        model = serializer.Meta.model
+        self.model = model
+        self.prefix = prefix
+        self.pk_column = prefix + model._meta.pk.attname
+        self.columns = [self.pk_column]
+        self.plan = []
+        self.many = []
+        self.m2m = []
+
+        for name, field in serializer.fields.items():
+            source = field.source
+            if isinstance(field, serializers.ListSerializer):
+                relation = model._meta.get_field(source)
+                if prefix or not relation.one_to_many:
+                    raise ImproperlyConfigured(f"Can't compile nested list {name!r}")
+                child = CompiledSerializer(type(field.child))
+                self.many.append((name, relation.field.attname, child))
+                self.plan.append((name, "many", None))
+            elif isinstance(field, serializers.BaseSerializer):
+                nested = CompiledSerializer(type(field), prefix=f"{prefix}{source}__")
+                self.columns += nested.columns
+                self.plan.append((name, "nested", nested))
+            elif isinstance(field, serializers.ManyRelatedField):
+                m2m_field = model._meta.get_field(source)
+                if prefix or not isinstance(
+                    field.child_relation, serializers.PrimaryKeyRelatedField
+                ):
+                    raise ImproperlyConfigured(f"Can't compile many-to-many {name!r}")
+                self.m2m.append((name, m2m_field))
+                self.plan.append((name, "m2m", None))
+            elif isinstance(field, ImageSrcsetField):
+                column = prefix + source
+                self.columns.append(column)
+                self.plan.append((name, "srcset", (column, model._meta.get_field(source).storage)))
+            elif isinstance(field, serializers.PrimaryKeyRelatedField):
+                column = prefix + model._meta.get_field(source).attname
+                self.columns.append(column)
+                self.plan.append((name, "value", column))
+            elif isinstance(field, serializers.FileField):
+                column = prefix + source
+                self.columns.append(column)
+                self.plan.append((name, "file", (column, model._meta.get_field(source).storage)))
+            elif isinstance(field, PASSTHROUGH_FIELDS) and not field.source_attrs[1:]:
+                column = prefix + source
+                if column != self.pk_column:
+                    self.columns.append(column)
+                self.plan.append((name, "value", column))
+            else:
+                raise ImproperlyConfigured(
+                    f"Can't compile {type(field).__name__} {name!r} on {serializer_class.__name__}"
+                )
+
+    def _related(self, pks):
+        """Fetch nested many-relations and m2m pks for *pks* in one query each."""
+        related = {}
+        for name, fk_column, child in self.many:
+            rows = child.model.objects.filter(**{f"{fk_column}__in": pks}).order_by("pk")
+            grouped = defaultdict(list)
+            for row in rows.values(*dict.fromkeys([*child.columns, fk_column])):
+                grouped[row[fk_column]].append(row)
+            related[name] = (child, grouped)
+        for name, m2m_field in self.m2m:
+            through = m2m_field.remote_field.through
+            source = through._meta.get_field(m2m_field.m2m_field_name()).attname
+            target = through._meta.get_field(m2m_field.m2m_reverse_field_name()).attname
+            grouped = defaultdict(list)
+            rows = through.objects.filter(**{f"{source}__in": pks}).order_by("pk")
+            for owner, value in rows.values_list(source, target):
+                grouped[owner].append(value)
+            related[name] = (None, grouped)
+        return related
+
+    def _build(self, row, related, absolute):
+        if self.prefix and row[self.pk_column] is None:
+            return None
+        data = {}
+        pk = row[self.pk_column]
+        for name, kind, arg in self.plan:
+            if kind == "value":
+                data[name] = row[arg]
+            elif kind == "file":
+                column, storage = arg
+                value = row[column]
+                data[name] = absolute(storage.url(value)) if value else None
+            elif kind == "srcset":
+                column, storage = arg
+                data[name] = srcset_map(row[column], storage, absolute)
+            elif kind == "nested":
+                data[name] = arg._build(row, None, absolute)
+            elif kind == "many":
+                child, grouped = related[name]
+                data[name] = [child._build(child_row, None, absolute) for child_row in grouped[pk]]
+            else:
+                data[name] = related[name][1][pk]
+        return data
+
+    def serialize_rows(self, rows, request=None):
+        """Serialize ``.values(*self.columns)`` rows, keeping their order."""
+        rows = list(rows)
+        related = self._related([row[self.pk_column] for row in rows]) if rows else {}
+        absolute = request.build_absolute_uri if request is not None else (lambda url: url)
+        return [self._build(row, related, absolute) for row in rows]
+
+    def serialize_queryset(self, queryset, request=None):
+        return self.serialize_rows(queryset.values(*self.columns), request)
+
+
+@lru_cache(maxsize=64)
+def compile_serializer(serializer_class, fields=None):
+    return CompiledSerializer(serializer_class, fields=list(fields) if fields is not None else None)
+
+
+class FastPathSerializer(serializers.BaseSerializer):
+    """
+    Read-only serializer over ``.values()`` rows using a compiled plan.
+
+    Takes the rows the view's queryset produced (``compiled.columns``) and
+    handles ``many=True`` itself so that nested relations are fetched once for
+    the whole page.
+    """
+
+    def __new__(cls, *args, **kwargs):
+        # Skip BaseSerializer's ListSerializer wrapping for many=True.
+        return serializers.Field.__new__(cls, *args, **kwargs)
+
+    def __init__(self, instance=None, *, compiled, many=False, **kwargs):
+        self.compiled = compiled
+        self.many = many
+        super().__init__(instance, **kwargs)
+
+    def to_representation(self, instance):
+        request = self.context.get("request")
+        if self.many:
+            return self.compiled.serialize_rows(instance, request)
+        return self.compiled.serialize_rows([instance], request)[0]
@@ -0,0 +1,180 @@
+"""
+Incremental reading of product feeds.
+
+``ProductFeed`` yields product dicts one at a time, so memory use depends on
+the largest product rather than the size of the feed. It reads
+
+* JSON: the ``products`` array of a top-level object (``{"products": [...]}``)
+  or a top-level array, decoded element by element with
+  ``json.JSONDecoder.raw_decode`` over a sliding buffer;
+* NDJSON (``.ndjson``/``.jsonl``): one product per line;
+* either of them gzip-compressed (``.gz``, or detected from the magic bytes).
+
+``bytes_read`` and ``size`` refer to the file on disk (compressed bytes for
+gzip), for progress reporting.
+"""
+
+import gzip
+import io
+import json
+import os
+import re
+
+import orjson
+
+CHUNK_SIZE = 256 * 1024
+# The most characters one value (a product, or a skipped top-level key) may
+# span before the feed is rejected, so a corrupt feed isn't read into memory.
+MAX_VALUE_SIZE = 64 * 1024 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+# Errors this close to the end of the buffer may be a literal, number or
+# escape cut off by the chunk boundary ("-Infinit" is the longest).
+TRUNCATION_MARGIN = 8
+
+
+class FeedError(ValueError):
+    pass
+
+
+class _JSONStream:
+    """Decode consecutive JSON values from a text stream with a sliding buffer."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        if len(self.buffer) - self.pos > MAX_VALUE_SIZE:
+            raise FeedError(f"Product feed value longer than {MAX_VALUE_SIZE} characters")
+        chunk = self.stream.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character, or ``None`` at the end."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return None
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise FeedError(f"Expected {char!r} in product feed")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as exc:
+                # More input only helps when the value ran off the end of the
+                # buffer; an error before that is a corrupt feed.
+                if self._truncated(exc) and self._fill():
+                    continue
+                raise FeedError(f"Invalid JSON in product feed: {exc}") from exc
+            # A number at the end of the buffer may continue in the next chunk.
+            if NUMBER_TAIL.match(self.buffer, end).end() == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def _truncated(self, exc):
+        # A string is only unterminated when it runs to the end of the buffer.
+        return exc.pos >= len(self.buffer) - TRUNCATION_MARGIN or exc.msg.startswith("Unterminated string")
+
+    def array(self):
+        """Yield the items of the array starting at the current position."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise FeedError("Expected ',' or ']' in products array")
+
+
+class ProductFeed:
+    def __init__(self, path, format="auto"):
+        self.path = path
+        self.size = os.path.getsize(path)
+        name = path[:-3] if path.endswith(".gz") else path
+        if format == "auto":
+            format = "ndjson" if name.endswith(NDJSON_SUFFIXES) else "json"
+        if format not in ("json", "ndjson"):
+            raise FeedError(f"Unknown feed format: {format}")
+        self.format = format
+
+        self.raw = open(path, "rb")
+        compressed = self.raw.read(2) == GZIP_MAGIC
+        self.raw.seek(0)
+        binary = gzip.GzipFile(fileobj=self.raw) if compressed else self.raw
+        self.text = io.TextIOWrapper(binary, encoding="utf-8-sig")
+
+    @property
+    def bytes_read(self):
+        return self.raw.tell()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.text.close()
+        self.raw.close()
+
+    def __iter__(self):
+        return self._ndjson() if self.format == "ndjson" else self._json()
+
+    def _ndjson(self):
+        for line_number, line in enumerate(self.text, start=1):
+            if line.strip():
+                try:
+                    yield orjson.loads(line)
+                except orjson.JSONDecodeError as exc:
+                    raise FeedError(f"Invalid JSON on line {line_number}: {exc}") from exc
+
+    def _json(self):
+        stream = _JSONStream(self.text)
+        if stream.peek() == "[":
+            yield from stream.array()
+            return
+
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+        while True:
+            key = stream.value()
+            stream.expect(":")
+            if key == "products":
+                yield from stream.array()
+            else:
+                # Other top-level keys (total, skip, ...) are small; skip them.
+                stream.value()
+            char = stream.peek()
+            stream.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise FeedError("Expected ',' or '}' in product feed")
@@ -0,0 +1,66 @@
+import io
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from root.parsers import FastJSONParser
+from root.renderers import FastJSONRenderer
+from shop.models import Item
+from shop.serializers import ItemDocumentSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare DRF's JSON renderer/parser with the orjson ones on /shop/items/ output"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=1000,
+            help="Number of items in the rendered list (default: 1000)",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Timed runs per renderer/parser; the best is reported (default: 20)",
+        )
+
+    def handle(self, *args, **options):
+        if options["limit"] < 1 or options["repeat"] < 1:
+            raise CommandError("--limit and --repeat must be at least 1")
+
+        # The same data ItemViews hands to the renderer for an unpaginated list.
+        request = RequestFactory().get("/shop/items/")
+        items = Item.objects.order_by("pk")[:options["limit"]]
+        data = ItemDocumentSerializer(items, many=True, context={"request": request}).data
+        if not data:
+            raise CommandError("No items to benchmark; import some products first.")
+
+        stock, fast = JSONRenderer(), FastJSONRenderer()
+        content = stock.render(data)
+        if fast.render(data) != content:
+            self.stderr.write(self.style.WARNING("Rendered output differs between renderers."))
+
+        def best(func):
+            return min(timeit.repeat(func, number=1, repeat=options["repeat"])) * 1000
+
+        results = [
+            ("render", best(lambda: stock.render(data)), best(lambda: fast.render(data))),
+            (
+                "parse",
+                best(lambda: JSONParser().parse(io.BytesIO(content))),
+                best(lambda: FastJSONParser().parse(io.BytesIO(content))),
+            ),
+        ]
+
+        self.stdout.write(f"{len(data)} items, {len(content) / 1024:.1f} KiB of JSON")
+        for name, stock_ms, fast_ms in results:
+            self.stdout.write(
+                f"{name:<7} json {stock_ms:8.2f} ms   orjson {fast_ms:8.2f} ms   "
+                f"{stock_ms / fast_ms:5.1f}x"
+            )
+        self.stdout.write(self.style.SUCCESS("Benchmark finished."))
@@ -0,0 +1,64 @@
+from urllib.parse import urljoin
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.export import EXPORT_FORMATS, iter_item_documents
+
+
+class Command(BaseCommand):
+    help = "Stream every Item to NDJSON or CSV with constant memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format",
+            choices=sorted(EXPORT_FORMATS),
+            default="ndjson",
+            help="Output format (default: ndjson)",
+        )
+        parser.add_argument(
+            "--output",
+            type=str,
+            default="-",
+            help="File to write to (default: stdout)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Items read from the database per query (default: 1000)",
+        )
+        parser.add_argument(
+            "--base-url",
+            type=str,
+            default="",
+            help="Prefix media URLs with this origin, e.g. https://shop.example.com",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        writer, _ = EXPORT_FORMATS[options["format"]]
+        base_url = options["base_url"]
+        documents = iter_item_documents(
+            chunk_size=options["chunk_size"],
+            absolute=(lambda url: urljoin(base_url, url)) if base_url else None,
+        )
+
+        output = options["output"]
+        fh = None if output == "-" else open(output, "w", encoding="utf-8", newline="")
+        count = 0
+        try:
+            for line in writer(documents):
+                if fh is None:
+                    self.stdout.write(line, ending="")
+                else:
+                    fh.write(line)
+                count += 1
+        finally:
+            if fh is not None:
+                fh.close()
+
+        if output != "-":
+            rows = count - 1 if options["format"] == "csv" else count
+            self.stdout.write(self.style.SUCCESS(f"Exported {rows} items to {output}"))
@@ -0,0 +1,108 @@
+import os
+import re
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+from django.utils import timezone
+
+from root.storage import BLOB_PREFIX, blob_digest
+
+# ``images/watch.320w.webp`` -> ``images/watch``, see root.images.derivative_name.
+DERIVATIVE = re.compile(r"^(?P<root>.+)\.\d+w\.[a-z]+$")
+
+
+def walk(storage, path):
+    """Yield the name of every file under *path*."""
+    if not storage.exists(path):
+        return
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield f"{path}/{name}"
+    for name in directories:
+        yield from walk(storage, f"{path}/{name}")
+
+
+class Command(BaseCommand):
+    help = "Delete media blobs (and their derivatives) that no file field references"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="List what would be deleted without deleting it",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=float,
+            default=24,
+            help="Only delete files older than this many hours, so uploads whose "
+                 "rows are not committed yet survive (default: 24)",
+        )
+        parser.add_argument(
+            "--legacy",
+            action="store_true",
+            help="Also sweep the upload_to directories of files stored before "
+                 "content addressing",
+        )
+
+    def referenced_names(self):
+        names = set()
+        upload_dirs = set()
+        for model in apps.get_models():
+            for field in model._meta.get_fields():
+                if not isinstance(field, models.FileField):
+                    continue
+                names.update(
+                    model._default_manager.exclude(**{field.attname: ""})
+                    .exclude(**{f"{field.attname}__isnull": True})
+                    .values_list(field.attname, flat=True)
+                )
+                if isinstance(field.upload_to, str) and field.upload_to.strip("/"):
+                    upload_dirs.add(field.upload_to.strip("/").split("/")[0])
+        return names, upload_dirs
+
+    def handle(self, *args, **options):
+        if options["min_age"] < 0:
+            raise CommandError("--min-age must not be negative")
+
+        storage = default_storage
+        referenced, upload_dirs = self.referenced_names()
+        digests = {blob_digest(name) for name in referenced} - {None}
+        roots = {os.path.splitext(name)[0] for name in referenced}
+
+        def is_live(name):
+            digest = blob_digest(name)
+            if digest is not None:
+                return digest in digests
+            if name in referenced:
+                return True
+            match = DERIVATIVE.match(name)
+            return match is not None and match.group("root") in roots
+
+        candidates = list(walk(storage, BLOB_PREFIX))
+        if options["legacy"]:
+            for directory in sorted(upload_dirs - {BLOB_PREFIX}):
+                candidates.extend(walk(storage, directory))
+
+        cutoff = timezone.now() - timedelta(hours=options["min_age"])
+        deleted = freed = 0
+        for name in dict.fromkeys(candidates):
+            if is_live(name) or storage.get_modified_time(name) > cutoff:
+                continue
+            size = storage.size(name)
+            if options["dry_run"]:
+                self.stdout.write(f"Would delete {name} ({size} bytes)")
+            else:
+                storage.delete(name)
+            deleted += 1
+            freed += size
+
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {deleted} of {len(candidates)} files, {freed / 1024 / 1024:.1f} MiB."
+            )
+        )
@@ -0,0 +1,65 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from Accounts.models import UserProfile
+from root.images import generate_derivatives, get_formats, get_widths
+from shop.models import Item, ItemImage
+
+
+def _generate(args):
+    name, force = args
+    try:
+        return name, generate_derivatives(name, force=force), None
+    except Exception as exc:
+        return name, 0, str(exc)
+
+
+class Command(BaseCommand):
+    help = "Generate responsive image derivatives for every product and profile image"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Worker processes (default: number of CPUs)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate derivatives even if they are up to date",
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1")
+
+        names = set(Item.objects.exclude(image="").values_list("image", flat=True))
+        names.update(ItemImage.objects.exclude(image="").values_list("image", flat=True))
+        names.update(
+            UserProfile.objects.exclude(profile_image="").exclude(profile_image=None)
+            .values_list("profile_image", flat=True)
+        )
+        names = sorted(names)
+        self.stdout.write(
+            f"{len(names)} images, widths {', '.join(map(str, get_widths()))}, "
+            f"formats {', '.join(get_formats())}, {options['workers']} workers"
+        )
+
+        # Workers are forked; they must not share this process's connections.
+        connections.close_all()
+        written = failed = 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            jobs = ((name, options["force"]) for name in names)
+            for name, count, error in executor.map(_generate, jobs, chunksize=4):
+                if error:
+                    failed += 1
+                    self.stderr.write(self.style.WARNING(f"{name}: {error}"))
+                written += count
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote {written} derivatives for {len(names)} images ({failed} failed).")
+        )
@@ -1,31 +1,101 @@
 """
 Management command to import products from products.json.
 
-Reads every product from the JSON file, downloads all images
+Reads every product from the JSON file (streamed one product at a time,
+see shop.feeds; NDJSON and gzip feeds work too), downloads all images
 (thumbnail + gallery) into the media directory, and creates
 the corresponding Django model records:
   Category, Rating, ItemType, Item, ItemImage
 
+Images are downloaded concurrently (see shop.downloads) for the
+products ahead of the one being written, so downloads and database
+work overlap. Image URLs may also be paths relative to the JSON file
+(which must stay inside its directory) or, with --allow-local-files,
+file:// URLs.
+
+With --bulk, products are written in --batch-size batches, one
+transaction each, with bulk_create upserts instead of per-product
+queries.
+
+Each stored product's content hash, and the storage name of every
+downloaded image URL, are recorded (ImportedProduct, ImportedImage)
+in the same transaction as the product. Later runs skip products
+whose hash is unchanged and reuse known images instead of fetching
+them, so an interrupted run resumes after its last committed
+product or batch, and a re-run of an unchanged feed writes nothing.
+--full ignores the recorded hashes.
+
+Parsing, lookups, image fetching and storing, waiting for images and
+database writes are timed per stage (shop.stages); --report writes
+the timings as JSON.
+
 
 Written With AI model - Claude.
 """
 
-import json
+import hashlib
 import os
 import re
-import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from itertools import islice
 from pathlib import Path
+from typing import NamedTuple
 from urllib.parse import urlparse
 
-import requests
+import orjson
+
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.management.base import BaseCommand, CommandError
-
-from shop.models import Category, Item, ItemImage, ItemType, Rating
-
-
-class Command(BaseCommand):
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from root.images import schedule_derivatives
+from shop.cache import bump_generation
+from shop.documents import schedule_item_document_rebuild
+from shop.downloads import DownloadError, ImageDownloader
+from shop.facets import record_facet_change
+from shop.feeds import FeedError, ProductFeed
+from shop.models import (
+    Category, ImportedImage, ImportedProduct, Item, ItemImage, ItemType, Rating,
+)
+from shop.reference import get_or_create_reference, get_or_create_references
+from shop.search import get_search_backend
+from shop.stages import StageReportMixin
+
+# Part of every product hash; bump it when the product -> Item mapping
+# changes so the next run re-imports everything.
+IMPORT_VERSION = 1
+
+# Item fields a --bulk import overwrites on existing products.
+BULK_UPDATE_FIELDS = [
+    "title", "price", "discount_price", "number_of_items", "brand_name",
+    "description", "is_featured", "is_bestselling",
+]
+
+
+def product_digest(p: dict) -> str:
+    payload = orjson.dumps([IMPORT_VERSION, p], option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(payload).hexdigest()
+
+
+def url_digest(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+class FeedEntry(NamedTuple):
+    idx: int
+    product: dict
+    sku: str
+    digest: str
+    # None, or why the product is skipped: "exists" or "unchanged".
+    skip: str | None
+    # (thumb, gallery) of (url, future) pairs, for products not skipped.
+    downloads: tuple | None
+
+
+class Command(StageReportMixin, BaseCommand):
     help = "Import products from products.json and download their images"
 
     def add_arguments(self, parser):
@@ -35,11 +105,56 @@ class Command(BaseCommand):
             default="products.json",
             help="Path to the JSON file (default: products.json in project root)",
         )
+        parser.add_argument(
+            "--format",
+            choices=["auto", "json", "ndjson"],
+            default="auto",
+            help="Feed format; auto picks ndjson for .ndjson/.jsonl files (default: auto)",
+        )
         parser.add_argument(
             "--skip-existing",
             action="store_true",
             help="Skip products whose product_id (SKU) already exists",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Concurrent image downloads (default: 8)",
+        )
+        parser.add_argument(
+            "--per-host",
+            type=int,
+            default=4,
+            help="Concurrent downloads from any one host (default: 4)",
+        )
+        parser.add_argument(
+            "--retries",
+            type=int,
+            default=3,
+            help="Retries per image after the first attempt (default: 3)",
+        )
+        parser.add_argument(
+            "--allow-local-files",
+            action="store_true",
+            help="Read file:// image URLs from anywhere on this machine",
+        )
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Write products in batches with bulk upserts (for large imports)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Products per transaction with --bulk (default: 1000)",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Re-import and re-download every product, ignoring what earlier runs recorded",
+        )
 
     # ------------------------------------------------------------------
     # Helpers
@@ -52,42 +167,6 @@ class Command(BaseCommand):
         text = re.sub(r"[^\w\s-]", "", text)
         return re.sub(r"[\s-]+", "-", text)
 
-    def _download_image(self, url: str, upload_to: str, filename: str) -> str | None:
-        """
-        Download *url* and save it under  MEDIA_ROOT / upload_to / filename.
-        Returns the relative media path (e.g. 'images/some-file.webp')
-        or None on failure.
-        """
-        dest_dir = os.path.join(settings.MEDIA_ROOT, upload_to)
-        os.makedirs(dest_dir, exist_ok=True)
-
-        dest_path = os.path.join(dest_dir, filename)
-
-        # Skip if the file already exists on disk
-        if os.path.exists(dest_path):
-            self.stdout.write(f"  ⏭  Already exists: {dest_path}")
-            return os.path.join(upload_to, filename)
-
-        for attempt in range(3):
-            try:
-                resp = requests.get(url, timeout=30, stream=True)
-                resp.raise_for_status()
-                with open(dest_path, "wb") as fh:
-                    for chunk in resp.iter_content(chunk_size=8192):
-                        fh.write(chunk)
-                self.stdout.write(f"  ✅ Downloaded: {filename}")
-                return os.path.join(upload_to, filename)
-            except requests.RequestException as exc:
-                self.stderr.write(
-                    self.style.WARNING(
-                        f"  ⚠  Attempt {attempt + 1}/3 failed for {url}: {exc}"
-                    )
-                )
-                time.sleep(2)
-
-        self.stderr.write(self.style.ERROR(f"  ❌ Failed to download: {url}"))
-        return None
-
     @staticmethod
     def _ext_from_url(url: str) -> str:
         """Extract the file extension from a URL (e.g. '.webp')."""
@@ -101,6 +180,10 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         json_path = options["file"]
         skip_existing = options["skip_existing"]
+        if options["workers"] < 1 or options["per_host"] < 1 or options["retries"] < 0:
+            raise CommandError("--workers and --per-host must be at least 1, --retries at least 0")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
 
         # Resolve relative path against project root (BASE_DIR)
         if not os.path.isabs(json_path):
@@ -109,75 +192,299 @@ class Command(BaseCommand):
         if not os.path.exists(json_path):
             raise CommandError(f"JSON file not found: {json_path}")
 
-        with open(json_path, "r", encoding="utf-8") as fh:
-            data = json.load(fh)
+        try:
+            feed = ProductFeed(json_path, format=options["format"])
+        except FeedError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\n📦 Importing products from {json_path} ({feed.size / 1024 / 1024:.1f} MiB)\n"
+            )
+        )
 
-        products = data.get("products", [])
-        if not products:
+        counts = Counter()
+        downloader = ImageDownloader(
+            workers=options["workers"],
+            per_host=options["per_host"],
+            retries=options["retries"],
+            source_dir=os.path.dirname(json_path),
+            report=self.report,
+            allow_local_files=options["allow_local_files"],
+        )
+        # Products whose images are downloading while earlier ones are saved;
+        # in bulk mode that is the whole next batch.
+        window = options["workers"] * 4
+        if options["bulk"]:
+            window += options["batch_size"]
+        entries = self._pipeline(feed, skip_existing, options["full"], downloader, window)
+
+        try:
+            with feed, downloader:
+                if options["bulk"]:
+                    self._import_in_batches(entries, feed, options["batch_size"], counts)
+                else:
+                    self._import_one_by_one(entries, feed, counts)
+        except FeedError as exc:
+            raise CommandError(f"Could not read {json_path}: {exc}")
+
+        if not counts:
             raise CommandError("No products found in JSON file")
 
+        # Summary
+        self.stdout.write("\n" + "=" * 60)
         self.stdout.write(
-            self.style.SUCCESS(f"\n📦 Found {len(products)} products to import\n")
+            self.style.SUCCESS(f"✅ Created : {counts['created']}")
         )
+        if counts["updated"]:
+            self.stdout.write(f"🔁 Updated : {counts['updated']}")
+        if counts["skipped"]:
+            self.stdout.write(f"⏭  Skipped : {counts['skipped']}")
+        if counts["unchanged"]:
+            self.stdout.write(f"💤 Unchanged: {counts['unchanged']}")
+        if counts["errors"]:
+            self.stdout.write(
+                self.style.ERROR(f"❌ Errors  : {counts['errors']}")
+            )
+        self.stdout.write("=" * 60 + "\n")
 
-        created_count = 0
-        skipped_count = 0
-        error_count = 0
-
-        for idx, p in enumerate(products, start=1):
-            sku = p.get("sku", f"UNKNOWN-{idx}")
-            title = p.get("title", "Untitled")
+    def _import_one_by_one(self, entries, feed, counts: Counter):
+        for entry in entries:
+            title = entry.product.get("title", "Untitled")
 
             self.stdout.write(
                 self.style.HTTP_INFO(
-                    f"\n[{idx}/{len(products)}] Processing: {title} ({sku})"
+                    f"\n[{entry.idx} | {self._progress(feed)}] Processing: {title} ({entry.sku})"
                 )
             )
 
-            # Check for existing product
-            if skip_existing and Item.objects.filter(product_id=sku).exists():
+            # Check for existing or unchanged product
+            if entry.skip == "exists":
                 self.stdout.write(f"  ⏭  Skipped (already exists)")
-                skipped_count += 1
+                counts["skipped"] += 1
+                continue
+            if entry.skip == "unchanged":
+                self.stdout.write(f"  💤 Unchanged since the last import")
+                counts["unchanged"] += 1
                 continue
 
             try:
-                self._import_single_product(p, sku, title)
-                created_count += 1
+                thumb_path, image_paths, stored, complete = self._collect(entry.downloads)
+                with self.report.stage("write") as write, transaction.atomic():
+                    self._import_single_product(entry.product, entry.sku, title, thumb_path, image_paths)
+                    self._record_imports([(entry, stored, complete)])
+                    write.add(rows=1)
+                counts["created"] += 1
             except Exception as exc:
                 self.stderr.write(
-                    self.style.ERROR(f"  ❌ Error importing {sku}: {exc}")
+                    self.style.ERROR(f"  ❌ Error importing {entry.sku}: {exc}")
                 )
-                error_count += 1
-
-        # Summary
-        self.stdout.write("\n" + "=" * 60)
-        self.stdout.write(
-            self.style.SUCCESS(f"✅ Created : {created_count}")
-        )
-        if skipped_count:
-            self.stdout.write(f"⏭  Skipped : {skipped_count}")
-        if error_count:
+                counts["errors"] += 1
+
+    def _import_in_batches(self, entries, feed, batch_size: int, counts: Counter):
+        while batch := list(islice(entries, batch_size)):
+            to_import = [entry for entry in batch if entry.skip is None]
+            for entry in batch:
+                if entry.skip:
+                    counts["skipped" if entry.skip == "exists" else "unchanged"] += 1
+            if to_import:
+                try:
+                    created, updated = self._import_batch(to_import)
+                    counts["created"] += created
+                    counts["updated"] += updated
+                except Exception as exc:
+                    self.stderr.write(
+                        self.style.ERROR(f"  ❌ Error importing batch ending at {batch[-1].sku}: {exc}")
+                    )
+                    counts["errors"] += len(to_import)
             self.stdout.write(
-                self.style.ERROR(f"❌ Errors  : {error_count}")
+                self.style.HTTP_INFO(f"[{batch[-1].idx} | {self._progress(feed)}] Batch written")
             )
-        self.stdout.write("=" * 60 + "\n")
 
-    def _import_single_product(self, p: dict, sku: str, title: str):
-        """Create one Item (+ related records) from a product dict."""
+    def _pipeline(self, feed, skip_existing: bool, full: bool, downloader, window: int):
+        """
+        Yield a FeedEntry per product in order, keeping the images of the
+        next *window* products downloading.
+
+        Only the window is held in memory, so the feed is read as a stream.
+        Existing SKUs, recorded hashes and known image URLs are looked up
+        with one query each per window.
+        """
+        queue = deque()
+        upcoming = enumerate(feed, start=1)
+        staged = deque()
+        exhausted = False
+
+        def stage():
+            nonlocal exhausted
+            with self.report.stage("parse") as parse:
+                bytes_read = feed.bytes_read
+                chunk = [
+                    (idx, p, p.get("sku", f"UNKNOWN-{idx}"), product_digest(p))
+                    for idx, p in islice(upcoming, window)
+                ]
+                parse.add(rows=len(chunk), bytes=feed.bytes_read - bytes_read)
+            exhausted = len(chunk) < window
+            if not chunk:
+                return
+
+            with self.report.stage("lookup") as lookup:
+                lookup.add(rows=len(chunk))
+                skus = [sku for _, _, sku, _ in chunk]
+                existing = set()
+                if skip_existing:
+                    existing = set(
+                        Item.objects.filter(product_id__in=skus).values_list("product_id", flat=True)
+                    )
+                recorded = {}
+                if not full:
+                    # A recorded hash only counts while its item still exists.
+                    recorded = dict(
+                        ImportedProduct.objects.filter(product_id__in=skus)
+                        .filter(Exists(Item.objects.filter(product_id=OuterRef("product_id"))))
+                        .values_list("product_id", "content_hash")
+                    )
+
+                entries = []
+                urls = set()
+                for idx, p, sku, digest in chunk:
+                    skip = "exists" if sku in existing else "unchanged" if recorded.get(sku) == digest else None
+                    entries.append((idx, p, sku, digest, skip))
+                    if skip is None:
+                        urls.update(self._image_urls(p))
+                known = {}
+                if urls and not full:
+                    by_hash = {url_digest(url): url for url in urls}
+                    known = {
+                        by_hash[url_hash]: image
+                        for url_hash, image in ImportedImage.objects.filter(url_hash__in=by_hash)
+                        .values_list("url_hash", "image")
+                    }
+            staged.extend((*entry, known) for entry in entries)
+
+        def enqueue():
+            if not staged and not exhausted:
+                stage()
+            if staged:
+                idx, p, sku, digest, skip, known = staged.popleft()
+                downloads = None if skip else self._submit_downloads(downloader, p, known)
+                queue.append(FeedEntry(idx, p, sku, digest, skip, downloads))
+
+        for _ in range(window):
+            enqueue()
+        while queue:
+            entry = queue.popleft()
+            enqueue()
+            yield entry
+
+    @staticmethod
+    def _progress(feed) -> str:
+        done = feed.bytes_read / feed.size if feed.size else 1
+        return f"{feed.bytes_read / 1024 / 1024:.1f}/{feed.size / 1024 / 1024:.1f} MiB, {done:.0%}"
+
+    @staticmethod
+    def _image_urls(p: dict) -> list:
+        thumb_url = p.get("thumbnail", "")
+        return ([thumb_url] if thumb_url else []) + list(p.get("images", []))
+
+    def _submit_downloads(self, downloader, p: dict, known: dict):
+        """
+        Start downloading a product's thumbnail and gallery images; URLs in
+        *known* whose file is still stored are reused without fetching.
+        """
+        def submit(url, name):
+            path = known.get(url)
+            if path and default_storage.exists(path):
+                future = Future()
+                future.set_result(path)
+                return future
+            return downloader.submit(url, name)
+
+        slug = self._slugify(p.get("title", "Untitled"))
+        thumb_url = p.get("thumbnail", "")
+        thumb = None
+        if thumb_url:
+            ext = self._ext_from_url(thumb_url)
+            thumb = (thumb_url, submit(thumb_url, f"images/{slug}-thumb{ext}"))
+        gallery = [
+            (url, submit(url, f"item_images/{slug}-{img_idx}{self._ext_from_url(url)}"))
+            for img_idx, url in enumerate(p.get("images", []), start=1)
+        ]
+        return thumb, gallery
+
+    def _download_result(self, url: str, future, verbose: bool = True) -> str | None:
+        """Wait for one download; returns the stored media path or None on failure."""
+        try:
+            path = future.result()
+        except DownloadError as exc:
+            self.stderr.write(self.style.ERROR(f"  ❌ Failed to download: {exc}"))
+            return None
+        if verbose:
+            self.stdout.write(f"  ✅ Downloaded: {url} -> {path}")
+        return path
+
+    def _collect(self, downloads, verbose: bool = True):
+        """
+        Wait for a product's downloads. Returns the thumbnail path, the
+        gallery paths, {url: path} of what was stored, and whether every
+        image was.
+        """
+        thumb, gallery = downloads
+        with self.report.stage("wait"):
+            thumb_path = self._download_result(*thumb, verbose=verbose) if thumb else None
+            image_paths = [self._download_result(url, future, verbose) for url, future in gallery]
+
+        pairs = ([(thumb[0], thumb_path)] if thumb else []) + [
+            (url, path) for (url, _), path in zip(gallery, image_paths)
+        ]
+        stored = {url: path for url, path in pairs if path}
+        return thumb_path, image_paths, stored, len(stored) == len({url for url, _ in pairs})
+
+    def _record_imports(self, results: list):
+        """
+        Record the images stored and the hashes of the products stored
+        completely, from (entry, stored, complete) tuples; runs inside the
+        transaction that wrote the products.
+        """
+        ImportedImage.objects.bulk_create(
+            [
+                ImportedImage(url_hash=url_digest(url), url=url, image=path)
+                for url, path in {
+                    url: path for _, stored, _ in results for url, path in stored.items()
+                }.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["url_hash"],
+            update_fields=["image"],
+        )
+        ImportedProduct.objects.bulk_create(
+            [
+                ImportedProduct(product_id=sku, content_hash=digest)
+                for sku, digest in {
+                    entry.sku: entry.digest for entry, _, complete in results if complete
+                }.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["product_id"],
+            update_fields=["content_hash", "imported_at"],
+        )
+
+    def _product_values(self, p: dict, title: str):
+        """
+        Split a product dict into the names of its reference rows and the
+        plain Item field values.
+        """
 
         # ---- Category ---------------------------------------------------
         cat_name = (p.get("category") or "Uncategorized").title()
-        category, _ = Category.objects.get_or_create(name=cat_name)
 
         # ---- ItemType (from first tag) ----------------------------------
         tags = p.get("tags", [])
         type_name = tags[0].title() if tags else cat_name
-        item_type, _ = ItemType.objects.get_or_create(name=type_name)
 
         # ---- Rating (rounded to int, clamped 1-5) -----------------------
         raw_rating = p.get("rating", 0)
         rating_val = max(1, min(5, round(raw_rating)))
-        rating_obj, _ = Rating.objects.get_or_create(value=rating_val)
 
         # ---- Price / discount -------------------------------------------
         price = int(round(p.get("price", 0)))
@@ -193,30 +500,32 @@ class Command(BaseCommand):
         # ---- Brand ------------------------------------------------------
         brand = p.get("brand", "Unknown")
 
-        # ---- Download thumbnail -----------------------------------------
-        slug = self._slugify(title)
-        thumb_url = p.get("thumbnail", "")
-        thumb_path = None
-        if thumb_url:
-            ext = self._ext_from_url(thumb_url)
-            thumb_filename = f"{slug}-thumb{ext}"
-            thumb_path = self._download_image(thumb_url, "images", thumb_filename)
+        references = {"category": cat_name, "type": type_name, "ratings": rating_val}
+        values = {
+            "title": title[:200],
+            "price": price,
+            "discount_price": discount_price,
+            "number_of_items": stock,
+            "brand_name": brand[:100],
+            "description": description,
+            "is_featured": False,
+            "is_bestselling": False,
+        }
+        return references, values
+
+    def _import_single_product(self, p: dict, sku: str, title: str,
+                               thumb_path: str | None, image_paths: list):
+        """Create one Item (+ related records) from a product dict."""
+        references, values = self._product_values(p, title)
 
         # ---- Create or update the Item ----------------------------------
         item, item_created = Item.objects.update_or_create(
             product_id=sku,
             defaults={
-                "title": title[:200],
-                "price": price,
-                "discount_price": discount_price,
-                "number_of_items": stock,
-                "brand_name": brand[:100],
-                "category": category,
-                "type": item_type,
-                "ratings": rating_obj,
-                "description": description,
-                "is_featured": False,
-                "is_bestselling": False,
+                **values,
+                "category": get_or_create_reference(Category, references["category"]),
+                "type": get_or_create_reference(ItemType, references["type"]),
+                "ratings": get_or_create_reference(Rating, references["ratings"]),
             },
         )
 
@@ -228,14 +537,95 @@ class Command(BaseCommand):
         action = "Created" if item_created else "Updated"
         self.stdout.write(f"  📝 {action}: {item}")
 
-        # ---- Download gallery images & create ItemImage records ---------
-        image_urls = p.get("images", [])
-        for img_idx, img_url in enumerate(image_urls, start=1):
-            ext = self._ext_from_url(img_url)
-            img_filename = f"{slug}-{img_idx}{ext}"
-            img_path = self._download_image(img_url, "item_images", img_filename)
+        # ---- Create ItemImage records for the downloaded gallery ---------
+        for img_idx, img_path in enumerate(image_paths, start=1):
             if img_path:
                 # Avoid duplicate ItemImage rows
                 if not ItemImage.objects.filter(item=item, image=img_path).exists():
                     ItemImage.objects.create(item=item, image=img_path)
                     self.stdout.write(f"  🖼  Added gallery image {img_idx}")
+
+    def _import_batch(self, entries: list):
+        """
+        Upsert a batch of products in one transaction with a handful of
+        queries; returns (created, updated).
+
+        bulk_create sends no signals, so the generation bumps, document
+        rebuilds, search/facet updates and image derivatives the receivers
+        in shop.signals would trigger are done here for the whole batch.
+        """
+        products = {}
+        results = []
+        for entry in entries:
+            thumb_path, image_paths, stored, complete = self._collect(entry.downloads, verbose=False)
+            # A SKU repeated within the batch: the last occurrence wins.
+            products[entry.sku] = (
+                *self._product_values(entry.product, entry.product.get("title", "Untitled")),
+                thumb_path,
+                image_paths,
+            )
+            results.append((entry, stored, complete))
+
+        with self.report.stage("write") as write, transaction.atomic():
+            write.add(rows=len(products))
+            lookups = {
+                field: get_or_create_references(model, {refs[field] for refs, *_ in products.values()})
+                for field, model in (("category", Category), ("type", ItemType), ("ratings", Rating))
+            }
+            existing = set(
+                Item.objects.filter(product_id__in=products).values_list("product_id", flat=True)
+            )
+
+            with_image, without_image = [], []
+            for sku, (references, values, thumb_path, _) in products.items():
+                item = Item(
+                    product_id=sku,
+                    **values,
+                    **{field: lookups[field][name] for field, name in references.items()},
+                )
+                if thumb_path:
+                    item.image = thumb_path
+                    with_image.append(item)
+                else:
+                    # Keep the current image of an existing item whose thumbnail failed.
+                    without_image.append(item)
+
+            update_fields = [*BULK_UPDATE_FIELDS, "category", "type", "ratings"]
+            for items, fields in ((with_image, [*update_fields, "image"]), (without_image, update_fields)):
+                if items:
+                    Item.objects.bulk_create(
+                        items,
+                        update_conflicts=True,
+                        unique_fields=["product_id"],
+                        update_fields=fields,
+                    )
+
+            item_ids = dict(
+                Item.objects.filter(product_id__in=products).values_list("product_id", "pk")
+            )
+            ItemImage.objects.bulk_create(
+                [
+                    ItemImage(item_id=item_ids[sku], image=path)
+                    for sku, (*_, image_paths) in products.items()
+                    for path in dict.fromkeys(image_paths)
+                    if path
+                ],
+                ignore_conflicts=True,
+            )
+
+            self._record_imports(results)
+
+            ids = list(item_ids.values())
+            for model in (Item, ItemImage):
+                bump_generation(model)
+                transaction.on_commit(lambda model=model: bump_generation(model))
+            schedule_item_document_rebuild(ids)
+            get_search_backend().index_items(ids)
+            record_facet_change(ids)
+            schedule_derivatives(
+                [thumb_path for *_, thumb_path, _ in products.values()]
+                + [path for *_, image_paths in products.values() for path in image_paths]
+            )
+
+        created = len(products) - len(existing)
+        return created, len(existing)
@@ -1,8 +1,9 @@
 from django.core.management.base import BaseCommand
 from shop.models import Category
+from shop.stages import StageReportMixin
 
 
-class Command(BaseCommand):
+class Command(StageReportMixin, BaseCommand):
     help = 'Populate categories'
 
     def handle(self, *args, **options):
@@ -23,7 +24,9 @@ class Command(BaseCommand):
             'automotive',
         ]
 
-        for category in categories:
-            Category.objects.get_or_create(name=category)
+        with self.report.stage("write") as write:
+            for category in categories:
+                Category.objects.get_or_create(name=category)
+            write.add(rows=len(categories))
 
         self.stdout.write(self.style.SUCCESS('Categories populated successfully.'))
\ No newline at end of file
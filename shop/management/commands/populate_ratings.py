@@ -1,11 +1,14 @@
 from django.core.management.base import BaseCommand
 from shop.models import Rating
+from shop.stages import StageReportMixin
 
-class Command(BaseCommand):
+class Command(StageReportMixin, BaseCommand):
     help = 'Populate product ratings'
 
     def handle(self, *args, **options):
-        for i in range(1, 6):
-            Rating.objects.get_or_create(value=i)
+        with self.report.stage("write") as write:
+            for i in range(1, 6):
+                Rating.objects.get_or_create(value=i)
+            write.add(rows=5)
 
         self.stdout.write(self.style.SUCCESS('Product ratings populated successfully.'))
\ No newline at end of file
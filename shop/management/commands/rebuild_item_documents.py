@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from shop.documents import rebuild_item_documents
+
+
+class Command(BaseCommand):
+    help = "Rebuild the pre-serialized document stored on every Item"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Items serialized and written per bulk_update (default: 500)",
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild_item_documents(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} item documents."))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_item_price_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='document',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+FTS_COLUMNS = "title, brand_name, description, category, type"
+
+
+def create_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS shop_item_fts USING fts5("
+        f"{FTS_COLUMNS}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO shop_item_fts (rowid, {FTS_COLUMNS}) "
+        "SELECT i.id, i.title, i.brand_name, i.description, "
+        "COALESCE(c.name, ''), COALESCE(t.name, '') "
+        "FROM shop_item i "
+        "LEFT JOIN shop_category c ON c.id = i.category_id "
+        "LEFT JOIN shop_itemtype t ON t.id = i.type_id"
+    )
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS shop_item_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_item_document'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
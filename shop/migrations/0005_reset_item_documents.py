@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+def reset_documents(apps, schema_editor):
+    # Stored documents predate the image_srcset/srcset fields. Items without a
+    # document are served by building it on the fly until
+    # ``manage.py rebuild_item_documents`` has run.
+    Item = apps.get_model("shop", "Item")
+    Item.objects.exclude(document=None).update(document=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_item_fts_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_documents, migrations.RunPython.noop),
+    ]
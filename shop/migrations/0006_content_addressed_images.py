@@ -0,0 +1,43 @@
+from django.db import migrations
+
+from root.storage import ContentAddressedStorage, store_existing
+from shop.cache import bump_generation, invalidate_item_details
+
+
+def address_images(apps, schema_editor):
+    # Copy every product image to its content address and point the rows at
+    # it; duplicates collapse into one blob. The old files stay until
+    # ``manage.py gc_media_blobs --legacy`` removes them, and derivatives for
+    # the new names come from ``manage.py generate_image_derivatives``.
+    storage = ContentAddressedStorage()
+    Item = apps.get_model("shop", "Item")
+    ItemImage = apps.get_model("shop", "ItemImage")
+    addressed = {}
+
+    def address(name):
+        if name not in addressed:
+            addressed[name] = store_existing(storage, name)
+        return addressed[name]
+
+    for model in (Item, ItemImage):
+        for pk, name in model.objects.exclude(image="").values_list("pk", "image").iterator():
+            new_name = address(name)
+            if new_name != name:
+                model.objects.filter(pk=pk).update(image=new_name)
+
+    # Stored documents and cached responses embed the old URLs.
+    Item.objects.exclude(document=None).update(document=None)
+    bump_generation(Item)
+    bump_generation(ItemImage)
+    invalidate_item_details()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_reset_item_documents'),
+    ]
+
+    operations = [
+        migrations.RunPython(address_images, migrations.RunPython.noop),
+    ]
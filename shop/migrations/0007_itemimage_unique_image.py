@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:06
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def delete_duplicate_images(apps, schema_editor):
+    # Content addressing (0006) maps identical gallery images to one name, so
+    # an item can hold the same image more than once; keep the oldest row.
+    ItemImage = apps.get_model("shop", "ItemImage")
+    keep = (
+        ItemImage.objects.values("item", "image").annotate(keep=Min("pk"))
+        .values_list("keep", flat=True)
+    )
+    ItemImage.objects.exclude(pk__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_images, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='itemimage',
+            constraint=models.UniqueConstraint(fields=('item', 'image'), name='shop_itemimage_item_image_uniq'),
+        ),
+    ]
@@ -1,5 +1,9 @@
+from decimal import Decimal
+
 from django.conf import settings
 from django.db import models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from uuid import uuid4
 from django.utils import timezone
 from django.shortcuts import reverse
@@ -63,6 +67,13 @@ class Item(models.Model):
     is_featured = models.BooleanField(default=False)
     is_bestselling = models.BooleanField(default=False)
     colors = models.ManyToManyField(Color, through='ItemColor')
+    # Pre-serialized ItemSerilizers output, maintained by shop.documents.
+    document = models.JSONField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["price", "id"], name="shop_item_price_id_idx"),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.product_id})"                 
@@ -77,6 +88,11 @@ class ItemImage(models.Model):
     item = models.ForeignKey(Item, related_name='images', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='item_images/')
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["item", "image"], name="shop_itemimage_item_image_uniq"),
+        ]
+
     def __str__(self):
         return f"Image for {self.item.title}"
 
@@ -151,7 +167,15 @@ class Cart(models.Model):
     applied_coupon = models.ForeignKey(Coupon, on_delete=models.SET_NULL, null=True, blank=True)
 
     class Meta:
-        unique_together = ('user_name', 'item', 'ordered', 'item_size', 'item_color_code')
+        # Only the open cart has to be unique; ordered rows are history and
+        # the same line can be bought again.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user_name', 'item', 'item_size', 'item_color_code'],
+                condition=models.Q(ordered=False),
+                name='shop_cart_open_line_uniq',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.quantity} of {self.item.product_id} )"
@@ -167,6 +191,35 @@ class ContactMessage(models.Model):
         return f"Message from {self.email}"
 
 
+def delivery_charge():
+    return Decimal(str(getattr(settings, "SHOP_DELIVERY_CHARGE", 80)))
+
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+LINE_TOTAL = ExpressionWrapper(F("price") * F("quantity"), output_field=MONEY)
+ZERO = Value(Decimal("0.00"))
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotate ``subtotal``, ``item_count`` (units) and ``grand_total`` in the same query.
+
+        The totals are correlated subqueries rather than a join and GROUP BY,
+        so a sorted, limited page of orders can still be read off an index.
+        """
+        items = OrderItem.objects.filter(order=OuterRef("pk")).order_by().values("order")
+        return self.annotate(
+            subtotal=Coalesce(
+                Subquery(items.annotate(total=Sum(LINE_TOTAL)).values("total")), ZERO, output_field=MONEY
+            ),
+            item_count=Coalesce(Subquery(items.annotate(units=Sum("quantity")).values("units")), 0),
+            grand_total=ExpressionWrapper(
+                F("subtotal") + Value(delivery_charge()), output_field=MONEY
+            ),
+        )
+
+
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
     first_name = models.CharField(max_length=100)
@@ -186,12 +239,31 @@ class Order(models.Model):
 
     ordered = models.BooleanField(default=False)
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at"], name="shop_order_user_created_idx"),
+        ]
+
     def __str__(self):
         return f"Order {self.id} - {self.first_name} {self.last_name}"
 
+    def totals(self):
+        """Subtotal, item count and grand total, from ``with_totals()`` when the order was loaded with it."""
+        if not hasattr(self, "grand_total"):
+            totals = self.order_items.aggregate(
+                subtotal=Coalesce(Sum(LINE_TOTAL), ZERO, output_field=MONEY),
+                item_count=Coalesce(Sum("quantity"), 0),
+            )
+            self.subtotal = totals["subtotal"]
+            self.item_count = totals["item_count"]
+            self.grand_total = self.subtotal + delivery_charge()
+        return {"subtotal": self.subtotal, "item_count": self.item_count, "grand_total": self.grand_total}
+
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.order_items.all()) + 80  # Assuming 80 is the delivery charge
+        return self.totals()["grand_total"]
     
 class OrderItem(models.Model):
     order = models.ForeignKey('Order', on_delete=models.CASCADE, related_name='order_items')
@@ -215,3 +287,23 @@ class HeroSection(models.Model):
     button_1_Text = models.CharField(max_length=20)
     button_2_Text = models.CharField(max_length=20)
     image = models.ImageField(upload_to='HeroSection/')
+
+
+class ImportedProduct(models.Model):
+    """Content hash of a feed product as of the last import that stored it completely."""
+    product_id = models.CharField(max_length=20, unique=True)
+    content_hash = models.CharField(max_length=64)
+    imported_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.product_id
+
+
+class ImportedImage(models.Model):
+    """Storage name an image URL was downloaded to, so re-imports don't fetch it again."""
+    url_hash = models.CharField(max_length=64, unique=True)
+    url = models.TextField()
+    image = models.CharField(max_length=255)
+
+    def __str__(self):
+        return self.url
@@ -0,0 +1,170 @@
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class PositionEncoder(DjangoJSONEncoder):
+    """``DjangoJSONEncoder`` without its millisecond rounding of datetimes."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination on the whole ordering, not just its first field.
+
+    DRF's ``CursorPagination`` keys its cursor on ``ordering[0]`` and steps
+    over ties with an OFFSET that is capped at 1000, so a run of equal values
+    longer than that repeats forever. Here the cursor carries the value of
+    every ordering field of the boundary row, and the next page is
+    ``WHERE (a, b) > (a0, b0)`` spelled out as
+    ``a > a0 OR (a = a0 AND b > b0)``. The ordering must end on a unique
+    field so every row has a distinct key.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        ordering = [flip(field) for field in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(self.keyset_filter(ordering, self.cursor.position))
+
+        # One extra row tells us whether there is another page this way.
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+
+        if self.template is not None and (self.has_next or self.has_previous):
+            self.display_page_controls = True
+        return self.page
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None:
+            return None
+        try:
+            position = json.loads(cursor.position)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=0, reverse=cursor.reverse, position=position)
+
+    def keyset_filter(self, ordering, position):
+        """Rows strictly after *position* in *ordering*."""
+        after = Q()
+        for index, field in enumerate(ordering):
+            step = Q(**{f"{name(field)}__{compare(field)}": position[index]})
+            for prior, value in zip(ordering[:index], position):
+                step &= Q(**{name(prior): value})
+            after |= step
+        # The leading bound on its own lets the database seek on the index.
+        return after & Q(**{f"{name(ordering[0])}__{compare(ordering[0])}e": position[0]})
+
+    def get_position(self, row):
+        values = [row[name(field)] if isinstance(row, dict) else getattr(row, name(field))
+                  for field in self.ordering]
+        return json.dumps(values, cls=PositionEncoder)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self.get_position(self.page[-1])
+        else:
+            position = json.dumps(self.cursor.position, cls=PositionEncoder)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self.get_position(self.page[0])
+        else:
+            position = json.dumps(self.cursor.position, cls=PositionEncoder)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+
+def name(field):
+    return field.lstrip("-")
+
+
+def flip(field):
+    return field[1:] if field.startswith("-") else f"-{field}"
+
+
+def compare(field):
+    return "lt" if field.startswith("-") else "gt"
+
+
+class ItemCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination for the item catalog.
+
+    Each page is fetched with ``WHERE key > cursor ORDER BY key LIMIT n``
+    instead of an OFFSET scan, so page 1000 costs the same as page 1. The
+    paginator only switches on when the client asks for it with ``?cursor=``
+    or ``?page_size=``; plain ``/shop/items/`` keeps returning a flat list.
+    """
+
+    page_size = 24
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("id",)
+    ordering_query_param = "ordering"
+
+    # Every ordering ends on the primary key so ties on price stay stable.
+    ordering_choices = {
+        "id": ("id",),
+        "-id": ("-id",),
+        "price": ("price", "id"),
+        "-price": ("-price", "-id"),
+    }
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get(self.ordering_query_param)
+        return self.ordering_choices.get(ordering, self.ordering_choices["id"])
+
+
+class OrderCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination for a user's order history, newest first.
+
+    Pages are read off the ``(user, created_at)`` index, so a customer with
+    thousands of orders pays the same per page as one with a few.
+    """
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-created_at", "-id")
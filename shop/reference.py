@@ -0,0 +1,181 @@
+"""
+Process-local registry of the small reference tables.
+
+Category, ItemType, Size, Color, Rating and Districts have tens of rows
+each, but are read on most catalog requests. ``get_reference_table`` loads a
+table once and keeps it until the table's generation counter moves (see
+``shop.cache``; ``shop.signals`` bumps it on every save and delete) or it is
+``SHOP_REFERENCE_TTL`` seconds old, so id and name lookups are dict reads.
+The objects are shared between callers and must not be modified.
+
+The generation only reaches other processes through a shared cache, so a
+row another process added may be missing until the TTL runs out. Lookups
+that miss check the database and reload the table when the row is there,
+so new ids are never rejected as unknown.
+
+A table loaded inside a transaction may hold rows the transaction hasn't
+committed. It is only used by that transaction and dropped when it commits,
+so other threads never see those rows. Its uncommitted rows are checked
+against the database before it is reused, so a rollback can't leave them
+behind.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .cache import bump_generation, get_generations
+from .models import Category, Color, Districts, ItemType, Rating, Size
+
+# Reference model -> the field its rows are looked up by name with.
+REFERENCE_MODELS = {
+    Category: "name",
+    ItemType: "name",
+    Size: "name",
+    Color: "name",
+    Rating: "value",
+    Districts: "title",
+}
+
+
+class ReferenceTable:
+    def __init__(self, model, generation):
+        self.model = model
+        self.generation = generation
+        self.loaded_at = time.monotonic()
+        self.name_field = REFERENCE_MODELS[model]
+        self.rows = list(model.objects.order_by("pk"))
+        self.by_id = {obj.pk: obj for obj in self.rows}
+        self.by_name = {}
+        for obj in self.rows:
+            # Names aren't unique for every table; the oldest row wins, as
+            # with get_or_create on an existing name.
+            self.by_name.setdefault(getattr(obj, self.name_field), obj)
+
+    def all(self):
+        return list(self.rows)
+
+    def get(self, pk):
+        return self.by_id.get(pk)
+
+    def get_by_name(self, name):
+        return self.by_name.get(name)
+
+
+_tables = {}
+_lock = threading.Lock()
+
+
+def _is_current(table, generation):
+    ttl = getattr(settings, "SHOP_REFERENCE_TTL", 60)
+    return (
+        table is not None
+        and table.generation == generation
+        and time.monotonic() - table.loaded_at < ttl
+    )
+
+
+def _transaction_table(connection, model, generation):
+    """The table this connection's open transaction loaded for *model*, if still valid."""
+    tables = connection.__dict__.get("_reference_tables", {})
+    table = tables.get(model)
+    if not _is_current(table, generation):
+        return None
+    # The on_commit callback that drops the table doesn't run on a rollback,
+    # so check that the rows it has beyond the shared table weren't rolled
+    # back. Names are compared too: a rolled-back id can be handed out again.
+    shared = _tables.get(model)
+    extra = {
+        (obj.pk, getattr(obj, table.name_field)) for obj in table.rows
+        if shared is None or obj.pk not in shared.by_id
+    }
+    if extra and set(
+        model.objects.filter(pk__in=[pk for pk, name in extra]).values_list("pk", table.name_field)
+    ) != extra:
+        del tables[model]
+        return None
+    return table
+
+
+def _load_in_transaction(connection, model, generation):
+    table = ReferenceTable(model, generation)
+    tables = connection.__dict__.setdefault("_reference_tables", {})
+
+    def forget():
+        if tables.get(model) is table:
+            del tables[model]
+
+    tables[model] = table
+    transaction.on_commit(forget)
+    return table
+
+
+def get_reference_table(model, reload=False):
+    """Return the loaded table for *model*, reloading it if it has changed, expired or *reload* is set."""
+    generation = get_generations([model])[model._meta.label_lower]
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        if not reload:
+            for table in (_transaction_table(connection, model, generation), _tables.get(model)):
+                if _is_current(table, generation):
+                    return table
+        return _load_in_transaction(connection, model, generation)
+
+    table = _tables.get(model)
+    if not reload and _is_current(table, generation):
+        return table
+    with _lock:
+        current = _tables.get(model)
+        # Another thread may have reloaded it while this one waited.
+        if current is table or not _is_current(current, generation):
+            current = _tables[model] = ReferenceTable(model, generation)
+        return current
+
+
+def get_reference(model, pk):
+    """Return the *model* row with primary key *pk*, or ``None``."""
+    if pk is None:
+        return None
+    obj = get_reference_table(model).get(pk)
+    if obj is None and model.objects.filter(pk=pk).exists():
+        # Added by another process; this table is stale.
+        obj = get_reference_table(model, reload=True).get(pk)
+    return obj
+
+
+def get_or_create_reference(model, name):
+    """Return the *model* row named *name*, creating it if needed."""
+    table = get_reference_table(model)
+    obj = table.get_by_name(name)
+    if obj is None:
+        obj, created = model.objects.get_or_create(**{table.name_field: name})
+        if not created:
+            get_reference_table(model, reload=True)
+    return obj
+
+
+def get_or_create_references(model, names):
+    """Return ``{name: row}`` for every name in *names*, creating the missing rows in one query."""
+    table = get_reference_table(model)
+    found = {name: table.get_by_name(name) for name in set(names)}
+    missing = [name for name, obj in found.items() if obj is None]
+    if missing and model.objects.filter(**{f"{table.name_field}__in": missing}).exists():
+        # Some were created by another process since the table was loaded.
+        table = get_reference_table(model, reload=True)
+        found.update((name, table.get_by_name(name)) for name in missing)
+        missing = [name for name, obj in found.items() if obj is None]
+    if missing:
+        created = model.objects.bulk_create([model(**{table.name_field: name}) for name in missing])
+        found.update(zip(missing, created))
+        # bulk_create skips the post_save receiver that would do this.
+        bump_generation(model)
+        transaction.on_commit(lambda: bump_generation(model))
+    return found
+
+
+def reference_choices(model, empty_label=None):
+    """Form choices for *model* without a query per rendered select."""
+    choices = [("", empty_label)] if empty_label is not None else []
+    return choices + [(obj.pk, str(obj)) for obj in get_reference_table(model).all()]
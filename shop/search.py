@@ -0,0 +1,123 @@
+"""
+Full-text product search.
+
+The default backend keeps an SQLite FTS5 index (``shop_item_fts``, created by
+migration 0004) over item title, brand, description, category and type, keyed
+by item id and ranked with bm25. ``SHOP_SEARCH_BACKEND`` can name another
+``SearchBackend`` subclass; on databases other than SQLite the plain
+``DatabaseSearchBackend`` is used.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Item
+
+FTS_TABLE = "shop_item_fts"
+
+# bm25 weights for title, brand_name, description, category, type.
+FTS_WEIGHTS = (10.0, 4.0, 1.0, 3.0, 3.0)
+
+# Keeps IN (...) lists well under SQLite's bound-parameter limit.
+BATCH_SIZE = 500
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def query_tokens(query):
+    return _TOKEN_RE.findall(query.lower())[:16]
+
+
+class SearchBackend:
+    def search(self, query, limit, offset=0):
+        """Return up to *limit* matching item ids, best match first."""
+        raise NotImplementedError
+
+    def index_items(self, item_ids):
+        pass
+
+    def remove_items(self, item_ids):
+        pass
+
+    def rebuild(self):
+        """Re-index every item and return the number of indexed rows."""
+        return 0
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """Unindexed ``icontains`` search; works on any database, ranks by id."""
+
+    def search(self, query, limit, offset=0):
+        queryset = Item.objects.all()
+        for token in query_tokens(query):
+            queryset = queryset.filter(Q(title__icontains=token) | Q(brand_name__icontains=token))
+        return list(queryset.order_by("pk").values_list("pk", flat=True)[offset:offset + limit])
+
+
+class SQLiteFTSBackend(SearchBackend):
+    select_rows = (
+        "SELECT i.id, i.title, i.brand_name, i.description, "
+        "COALESCE(c.name, ''), COALESCE(t.name, '') "
+        "FROM shop_item i "
+        "LEFT JOIN shop_category c ON c.id = i.category_id "
+        "LEFT JOIN shop_itemtype t ON t.id = i.type_id"
+    )
+    insert_rows = (
+        f"INSERT OR REPLACE INTO {FTS_TABLE} "
+        "(rowid, title, brand_name, description, category, type) "
+    )
+
+    def search(self, query, limit, offset=0):
+        tokens = query_tokens(query)
+        if not tokens:
+            return []
+        # Quote every token so user input can't inject FTS syntax, and
+        # prefix-match them so partially typed words still hit.
+        match = " ".join(f'"{token}"*' for token in tokens)
+        weights = ", ".join(str(weight) for weight in FTS_WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s OFFSET %s",
+                [match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def _execute_batched(self, sql, item_ids):
+        item_ids = list(item_ids)
+        with connection.cursor() as cursor:
+            for start in range(0, len(item_ids), BATCH_SIZE):
+                batch = item_ids[start:start + BATCH_SIZE]
+                placeholders = ", ".join(["%s"] * len(batch))
+                cursor.execute(sql.format(placeholders=placeholders), batch)
+
+    def index_items(self, item_ids):
+        self._execute_batched(
+            f"{self.insert_rows}{self.select_rows} WHERE i.id IN ({{placeholders}})", item_ids
+        )
+
+    def remove_items(self, item_ids):
+        self._execute_batched(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({{placeholders}})", item_ids
+        )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(f"{self.insert_rows}{self.select_rows}")
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+            cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+            return cursor.fetchone()[0]
+
+
+def get_search_backend():
+    path = getattr(settings, "SHOP_SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == "sqlite":
+        return SQLiteFTSBackend()
+    return DatabaseSearchBackend()
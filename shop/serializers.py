@@ -1,25 +1,70 @@
+from django.db import models
 from rest_framework import serializers
 
+from root.images import ImageSrcsetField, rewrite_srcset_map
+
 from .models import (
     ContactMessage, Districts, Category, HeroSection, ItemType, OrderItem, Size, Rating, Color,
     Item, ItemImage, ItemSize, ItemColor, Cart, Order,
     Slider, BillingAddress, Payment, Coupon, Refund
 )
+from .fastpath import compile_serializer
+from .reference import REFERENCE_MODELS, get_reference
+
+
+class DynamicFieldsMixin:
+    """Keep only the fields named in the ``fields`` keyword argument."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ReferenceRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary-key relation that validates reference-table ids against ``shop.reference``."""
+
+    def to_internal_value(self, data):
+        model = self.get_queryset().model
+        if model not in REFERENCE_MODELS or self.pk_field is not None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            obj = get_reference(model, int(data))
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        if obj is None:
+            self.fail("does_not_exist", pk_value=data)
+        return obj
+
+
+class ReferenceSerializerMixin:
+    """When nested under a foreign key, read the related row from ``shop.reference``."""
+
+    def get_attribute(self, instance):
+        field = instance._meta.get_field(self.source)
+        if field.is_cached(instance):
+            return super().get_attribute(instance)
+        return get_reference(field.related_model, getattr(instance, field.attname))
 
 
 class ItemImageSerilizers(serializers.ModelSerializer):
+    srcset = ImageSrcsetField(source="image")
+
     class Meta:
         model = ItemImage
         fields = "__all__"
 
 
-class SizeSerilizers(serializers.ModelSerializer):
+class SizeSerilizers(ReferenceSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Size
         fields = "__all__"
 
 
-class ColorSerilizers(serializers.ModelSerializer):
+class ColorSerilizers(ReferenceSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Color
         fields = "__all__"
@@ -41,14 +86,105 @@ class ItemColorSerilizers(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class ItemSerilizers(serializers.ModelSerializer):
+class ItemSerilizers(DynamicFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = ReferenceRelatedField
+
     images = ItemImageSerilizers(many=True, read_only=True)
     item_size = ItemSizeSerilizers(many=True, read_only=True)
     item_color = ItemColorSerilizers(many=True, read_only=True)
+    image_srcset = ImageSrcsetField(source="image")
+
+    # Relations that are only sent with ``?expand=`` in sparse mode, and the
+    # prefetch each of them needs.
+    expandable_fields = {
+        "images": "images",
+        "item_size": "item_size__size",
+        "item_color": "item_color__color",
+        "colors": "colors",
+    }
 
     class Meta:
         model = Item
-        fields = "__all__"
+        exclude = ("document",)
+
+
+class ItemListSerilizers(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Flat item representation for product grids, without nested relations."""
+
+    serializer_related_field = ReferenceRelatedField
+
+    image_srcset = ImageSrcsetField(source="image")
+
+    default_fields = ("id", "title", "image", "image_srcset", "price", "discount_price")
+
+    class Meta:
+        model = Item
+        exclude = ("document", "colors")
+
+
+class ItemDocumentListSerializer(serializers.ListSerializer):
+    """Builds the documents a page is missing in one go rather than per item."""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        missing = [item.pk for item in items if item.document is None]
+        if missing:
+            built = {
+                document["id"]: document
+                for document in compile_serializer(ItemSerilizers).serialize_queryset(
+                    Item.objects.filter(pk__in=missing)
+                )
+            }
+            for item in items:
+                if item.document is None:
+                    item.document = built.get(item.pk)
+        return [self.child.to_representation(item) for item in items]
+
+
+class ItemDocumentSerializer(serializers.BaseSerializer):
+    """
+    Read-only item serializer that returns the stored ``Item.document``.
+
+    Output matches ``ItemSerilizers``; items without a document yet fall
+    back to it.
+    """
+
+    def to_representation(self, instance):
+        document = instance.document
+        if document is None:
+            document = ItemSerilizers(instance).data
+        return absolute_media_urls(document, self.context.get("request"))
+
+    class Meta:
+        list_serializer_class = ItemDocumentListSerializer
+
+
+def absolute_media_urls(document, request):
+    """Return a copy of an item document with absolute image URLs."""
+    if request is None:
+        return document
+    return rewrite_media_urls(document, request.build_absolute_uri)
+
+
+def rewrite_media_urls(document, rewrite):
+    """Return a copy of an item document with every image URL passed through *rewrite*."""
+
+    def absolute(url):
+        return rewrite(url) if url else url
+
+    return {
+        **document,
+        "image": absolute(document["image"]),
+        "image_srcset": rewrite_srcset_map(document["image_srcset"], rewrite),
+        "images": [
+            {
+                **image,
+                "image": absolute(image["image"]),
+                "srcset": rewrite_srcset_map(image["srcset"], rewrite),
+            }
+            for image in document["images"]
+        ],
+    }
         
 
 class CategorySerilizers(serializers.ModelSerializer):
@@ -117,16 +253,21 @@ class CartSerilizers(serializers.ModelSerializer):
         fields = "__all__"
         read_only_fields = ("user_name", "ordered", "delivered", "order_status")
         
+class OrderItemSerilizers(serializers.ModelSerializer):
+    class Meta:
+        model = OrderItem
+        fields = "__all__"
+
 class OrderSerilizers(serializers.ModelSerializer):
+    order_items = OrderItemSerilizers(many=True, read_only=True)
+    subtotal = serializers.DecimalField(max_digits=14, decimal_places=2, source="totals.subtotal", read_only=True)
+    item_count = serializers.IntegerField(source="totals.item_count", read_only=True)
+    grand_total = serializers.DecimalField(max_digits=14, decimal_places=2, source="totals.grand_total", read_only=True)
+
     class Meta:
         model = Order
         fields = "__all__"
         read_only_fields = ("user", "ordered", "created_at", "updated_at")
-        
-class OrderItemSerilizers(serializers.ModelSerializer):
-    class Meta:
-        model = OrderItem
-        fields = "__all__"
 
 class RatingSerilizers(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,187 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from root.images import schedule_derivatives
+
+from .cache import bump_generation, invalidate_item_details
+from .documents import schedule_item_document_rebuild
+from .facets import record_facet_change
+from .models import (
+    Category, Color, Districts, HeroSection, Item, ItemColor, ItemImage,
+    ItemSize, ItemType, Rating, Size, Slider,
+)
+from .search import get_search_backend
+
+CATALOG_MODELS = (
+    Category, Color, Districts, HeroSection, Item, ItemColor, ItemImage,
+    ItemSize, ItemType, Rating, Size, Slider,
+)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_catalog_generation(sender, **kwargs):
+    if sender in CATALOG_MODELS:
+        bump_generation(sender)
+        # Bump again once the change is visible, so nothing that read the
+        # old rows under the first bump (e.g. shop.reference) outlives it.
+        transaction.on_commit(lambda: bump_generation(sender))
+
+
+@receiver(m2m_changed, sender=Item.colors.through)
+def bump_item_colors_generation(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_generation(Item)
+        bump_generation(ItemColor)
+
+
+# ---- Item documents ---------------------------------------------------
+
+@receiver(post_save, sender=Item)
+def rebuild_item_document(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and set(update_fields) == {"document"}):
+        return
+    schedule_item_document_rebuild([instance.pk])
+
+
+@receiver(post_save, sender=ItemImage)
+@receiver(post_save, sender=ItemSize)
+@receiver(post_save, sender=ItemColor)
+@receiver(post_delete, sender=ItemImage)
+@receiver(post_delete, sender=ItemSize)
+@receiver(post_delete, sender=ItemColor)
+def rebuild_parent_item_document(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_item_document_rebuild([instance.item_id])
+
+
+@receiver(post_delete, sender=Item)
+def invalidate_deleted_item_details(sender, instance, **kwargs):
+    # Other changes are covered by the document rebuild; a deleted item has
+    # no document left to rebuild.
+    pk = instance.pk
+    transaction.on_commit(lambda: invalidate_item_details([pk]))
+
+
+# Deleting a Size or Color cascades to ItemSize/ItemColor, whose own
+# post_delete receivers above take care of the affected items.
+@receiver(post_save, sender=Size)
+def rebuild_size_item_documents(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_item_document_rebuild(
+            ItemSize.objects.filter(size=instance).values_list("item_id", flat=True)
+        )
+
+
+@receiver(post_save, sender=Color)
+def rebuild_color_item_documents(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_item_document_rebuild(
+            ItemColor.objects.filter(color=instance).values_list("item_id", flat=True)
+        )
+
+
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=ItemType)
+@receiver(pre_delete, sender=Rating)
+def rebuild_referencing_item_documents(sender, instance, **kwargs):
+    # Deleting these sets the item's foreign key to NULL without a save, so
+    # collect the affected items before the rows go away.
+    field = {Category: "category", ItemType: "type", Rating: "ratings"}[sender]
+    schedule_item_document_rebuild(
+        Item.objects.filter(**{field: instance}).values_list("pk", flat=True)
+    )
+
+
+@receiver(m2m_changed, sender=Item.colors.through)
+def rebuild_item_colors_documents(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            schedule_item_document_rebuild([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        schedule_item_document_rebuild(pk_set)
+    elif action == "pre_clear":
+        # The rows are gone by post_clear; the rebuild itself still runs
+        # after commit.
+        schedule_item_document_rebuild(
+            ItemColor.objects.filter(color=instance).values_list("item_id", flat=True)
+        )
+
+
+# ---- Image derivatives ------------------------------------------------
+
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=ItemImage)
+def generate_image_derivatives(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and "image" not in update_fields):
+        return
+    schedule_derivatives([instance.image.name])
+
+
+# ---- Search index -----------------------------------------------------
+
+@receiver(post_save, sender=Item)
+def index_item(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and set(update_fields) <= {"document", "image"}):
+        return
+    get_search_backend().index_items([instance.pk])
+
+
+@receiver(post_delete, sender=Item)
+def unindex_item(sender, instance, **kwargs):
+    get_search_backend().remove_items([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=ItemType)
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=ItemType)
+def reindex_category_items(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    field = "category" if sender is Category else "type"
+    item_ids = list(Item.objects.filter(**{field: instance}).values_list("pk", flat=True))
+    if item_ids:
+        # On delete the foreign key is only cleared later in the transaction.
+        transaction.on_commit(lambda: get_search_backend().index_items(item_ids))
+
+
+# ---- Facet index ------------------------------------------------------
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def journal_item_facets(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and set(update_fields) <= {"document", "image"}):
+        return
+    record_facet_change([instance.pk])
+
+
+@receiver(post_save, sender=ItemSize)
+@receiver(post_save, sender=ItemColor)
+@receiver(post_delete, sender=ItemSize)
+@receiver(post_delete, sender=ItemColor)
+def journal_parent_item_facets(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record_facet_change([instance.item_id])
+
+
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=ItemType)
+@receiver(pre_delete, sender=Rating)
+def journal_referencing_item_facets(sender, instance, **kwargs):
+    field = {Category: "category", ItemType: "type", Rating: "ratings"}[sender]
+    record_facet_change(Item.objects.filter(**{field: instance}).values_list("pk", flat=True))
+
+
+@receiver(m2m_changed, sender=Item.colors.through)
+def journal_item_colors_facets(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            record_facet_change([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        record_facet_change(pk_set)
+    elif action == "pre_clear":
+        record_facet_change(
+            ItemColor.objects.filter(color=instance).values_list("item_id", flat=True)
+        )
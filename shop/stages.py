@@ -0,0 +1,164 @@
+"""
+Per-stage timing for long-running management commands.
+
+A ``StageReport`` accumulates, per named stage, the number of times it ran,
+wall and CPU time, rows and bytes processed and database queries. Stages may
+run many times (once per product, per batch) and from worker threads; their
+figures add up. Stages can nest, and an outer stage includes everything
+recorded inside it. CPU time is per thread, so it shows how much of a
+stage's wall time its own thread was busy. Queries are counted on the
+default connection of the thread that opened the report.
+
+``StageReportMixin`` gives a command a ``self.report``, prints the summary
+table when the command finishes and adds ``--report PATH`` to write it as
+JSON, so runs can be compared over time.
+"""
+
+import json
+import platform
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.utils import timezone
+
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def add(self, rows=0, bytes=0):
+        with self._lock:
+            self.rows += rows
+            self.bytes += bytes
+
+    def _record(self, wall, cpu):
+        with self._lock:
+            self.calls += 1
+            self.wall += wall
+            self.cpu += cpu
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "wall_seconds": round(self.wall, 6),
+            "cpu_seconds": round(self.cpu, 6),
+            "rows": self.rows,
+            "rows_per_second": round(self.rows / self.wall, 2) if self.wall else None,
+            "bytes": self.bytes,
+            "bytes_per_second": round(self.bytes / self.wall, 2) if self.wall else None,
+            "queries": self.queries,
+        }
+
+
+class StageReport:
+    def __init__(self, name):
+        self.name = name
+        self.stages = {}
+        self.started_at = timezone.now()
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._start = None
+        self._wrapper = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._wrapper = connection.execute_wrapper(self._count_query)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+        self.elapsed = time.perf_counter() - self._start
+
+    def _count_query(self, execute, sql, params, many, context):
+        for stage in getattr(self._local, "active", ()):
+            stage.queries += 1
+        return execute(sql, params, many, context)
+
+    def get(self, name):
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = Stage(name)
+            return stage
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block as one run of stage *name*; yields the ``Stage`` for ``add()``."""
+        stage = self.get(name)
+        active = self._local.__dict__.setdefault("active", [])
+        active.append(stage)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield stage
+        finally:
+            stage._record(time.perf_counter() - wall, time.thread_time() - cpu)
+            active.pop()
+
+    def as_dict(self, **extra):
+        return {
+            "command": self.name,
+            "started_at": self.started_at.isoformat(),
+            "elapsed_seconds": round(self.elapsed, 6),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            **extra,
+            "stages": {name: stage.as_dict() for name, stage in self.stages.items()},
+        }
+
+    def write_table(self, stdout):
+        stdout.write(f"\n{'stage':<12}{'calls':>8}{'wall s':>10}{'cpu s':>9}{'rows':>10}"
+                     f"{'rows/s':>11}{'MiB':>9}{'MiB/s':>8}{'queries':>9}")
+        for stage in self.stages.values():
+            rate = stage.rows / stage.wall if stage.wall else 0
+            mib = stage.bytes / 1024 / 1024
+            stdout.write(
+                f"{stage.name:<12}{stage.calls:>8}{stage.wall:>10.2f}{stage.cpu:>9.2f}{stage.rows:>10}"
+                f"{rate:>11.1f}{mib:>9.1f}{(mib / stage.wall if stage.wall else 0):>8.1f}"
+                f"{stage.queries:>9}"
+            )
+        stdout.write(f"{'total':<12}{'':>8}{self.elapsed:>10.2f}")
+
+    def write_json(self, path, **extra):
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(self.as_dict(**extra), fh, indent=2)
+            fh.write("\n")
+
+
+class StageReportMixin:
+    """Management command mixin: ``self.report``, a summary table and ``--report PATH``."""
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.add_argument(
+            "--report",
+            metavar="PATH",
+            help="Also write the per-stage timings to PATH as JSON",
+        )
+        return parser
+
+    def execute(self, *args, **options):
+        self.report = StageReport(self.__module__.rpartition(".")[2])
+        with self.report:
+            output = super().execute(*args, **options)
+        self.report.write_table(self.stdout)
+        if options.get("report"):
+            arguments = {
+                key: value for key, value in options.items()
+                if key not in ("stdout", "stderr", "report")
+                and isinstance(value, (str, int, float, bool, type(None)))
+            }
+            self.report.write_json(options["report"], options=arguments)
+            self.stdout.write(self.style.SUCCESS(f"Stage report written to {options['report']}"))
+        return output
@@ -1,3 +1,1200 @@
-from django.test import TestCase
+import csv
+import io
+import gzip
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from decimal import Decimal
+from datetime import date, datetime, time, timedelta, timezone
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.db import transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .cache import CompressedVariants, get_cache, get_item_cache
+from root.images import derivative_name
+from root.middleware import CompressionMiddleware, choose_encoding
+from root.parsers import FastJSONParser
+from root.renderers import FastJSONRenderer
+
+from . import facets
+from .documents import rebuild_item_documents, schedule_item_document_rebuild
+from .downloads import DownloadError, ImageDownloader
+from .reference import (
+    get_or_create_reference, get_or_create_references, get_reference, get_reference_table,
+)
+from .facets import apply_facet_filters, get_facet_index, parse_facet_filters, record_facet_change
+from .fastpath import compile_serializer
+from .feeds import FeedError, ProductFeed
+from .models import (
+    Cart, Category, Color, Districts, Item, ItemColor, ItemImage, ItemSize, ItemType, Order,
+    OrderItem, Rating, Size, Slider,
+)
+from .search import SQLiteFTSBackend
+from .serializers import ItemListSerilizers, ItemSerilizers
+from .stages import StageReport
+from .views import BootstrapView, ItemViews
+
+
+class CompiledSerializerTests(TestCase):
+    """The compiled fast path must produce exactly what the DRF serializers do."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Watch")
+        item_type = ItemType.objects.create(name="Smart")
+        rating = Rating.objects.create(value=4)
+        sizes = [Size.objects.create(name=name) for name in ("S", "M")]
+        colors = [Color.objects.create(name=name, code=code) for name, code in (("Red", "#f00"), ("Blue", "#00f"))]
+
+        for n in range(4):
+            item = Item.objects.create(
+                title=f"Item {n}", image=f"images/{n}.jpg" if n else "",
+                ratings=rating if n % 2 else None, price=100 + n, number_of_items=3,
+                discount_price=90, product_id=f"SKU{n}", brand_name="Acme",
+                category=category if n != 3 else None, type=item_type,
+                description="Ünïcode desc", is_featured=bool(n % 2),
+            )
+            for image in range(n % 3):
+                ItemImage.objects.create(item=item, image=f"item_images/{n}-{image}.jpg")
+            for size in sizes[:n % 3]:
+                ItemSize.objects.create(item=item, size=size, price_for_this_size=120 + n)
+            for color in colors[:n % 3]:
+                ItemColor.objects.create(item=item, color=color)
+
+    def assertEquivalent(self, serializer_class, fields=None, request=None):
+        queryset = Item.objects.order_by("pk")
+        kwargs = {"fields": list(fields)} if fields is not None else {}
+        expected = serializer_class(
+            queryset, many=True, context={"request": request}, **kwargs
+        ).data
+        compiled = compile_serializer(serializer_class, fields)
+        actual = compiled.serialize_queryset(queryset, request)
+        self.assertEqual(json.dumps(actual), json.dumps(expected))
+
+    def test_full_document(self):
+        self.assertEquivalent(ItemSerilizers)
+
+    def test_full_document_with_absolute_urls(self):
+        self.assertEquivalent(ItemSerilizers, request=APIRequestFactory().get("/shop/items/"))
+
+    def test_grid_fields(self):
+        self.assertEquivalent(ItemListSerilizers, ItemListSerilizers.default_fields)
+
+    def test_sparse_fields_with_expand(self):
+        request = APIRequestFactory().get("/shop/items/")
+        fields = ("title", "category", "ratings", "item_size", "colors")
+        self.assertEquivalent(ItemSerilizers, fields, request=request)
+
+    def test_query_count_is_constant(self):
+        compiled = compile_serializer(ItemSerilizers)
+        # Items, images, sizes, colors and the colors m2m through table.
+        with self.assertNumQueries(5):
+            compiled.serialize_queryset(Item.objects.all())
+
+
+class ItemDetailCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Item.objects.create(
+            title="Watch", image="images/watch.jpg", price=100, number_of_items=3,
+            discount_price=90, product_id="SKU-1", brand_name="Acme", description="desc",
+        )
+
+    def setUp(self):
+        get_cache().clear()
+        get_item_cache().clear()
+
+    def test_detail_by_pk_and_product_id(self):
+        by_pk = self.client.get(f"/shop/items/{self.item.pk}/", HTTP_ACCEPT="application/json")
+        by_product = self.client.get("/shop/items/product/SKU-1/", HTTP_ACCEPT="application/json")
+        self.assertEqual(by_pk.json(), by_product.json())
+
+    def test_cached_until_item_changes(self):
+        url = f"/shop/items/{self.item.pk}/"
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ItemImage.objects.create(item=self.item, image="item_images/watch-2.jpg")
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.json()["images"]), 1)
+
+    def test_unknown_ids_are_negatively_cached(self):
+        self.assertEqual(self.client.get("/shop/items/product/NOPE/").status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/shop/items/product/NOPE/").status_code, 404)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Item.objects.create(
+                title="New", image="images/new.jpg", price=1, number_of_items=1,
+                discount_price=1, product_id="NOPE", brand_name="Acme", description="desc",
+            )
+        self.assertEqual(self.client.get("/shop/items/product/NOPE/").status_code, 200)
+
+
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Watch")
+        cls.item_type = ItemType.objects.create(name="Smart")
+        cls.rating = Rating.objects.create(value=4)
+        cls.size = Size.objects.create(name="M")
+        cls.color = Color.objects.create(name="Red", code="#f00")
+        cls.item = Item.objects.create(
+            title="Watch", image="", price=100, number_of_items=3, discount_price=90,
+            product_id="SKU-1", brand_name="Acme", description="desc",
+            category=cls.category, type=cls.item_type, ratings=cls.rating,
+        )
+        cls.image = ItemImage.objects.create(item=cls.item, image="item_images/watch.jpg")
+        cls.item_size = ItemSize.objects.create(item=cls.item, size=cls.size, price_for_this_size=110)
+        cls.item_color = ItemColor.objects.create(item=cls.item, color=cls.color)
+
+    def setUp(self):
+        get_cache().clear()
+
+    def get(self, url="/shop/items/?fields=id,title", **headers):
+        return self.client.get(url, HTTP_ACCEPT=headers.pop("accept", "application/json"), **headers)
+
+    def test_second_request_is_a_hit(self):
+        first = self.get()
+        self.assertEqual(first["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            second = self.get()
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["Content-Type"], first["Content-Type"])
+
+    def test_saving_or_deleting_any_cache_model_invalidates(self):
+        rows = [
+            self.image, self.item_size, self.item_color, self.item,
+            self.size, self.color, self.category, self.item_type, self.rating,
+        ]
+        self.assertCountEqual([type(row) for row in rows], ItemViews.cache_models)
+        for write in ("save", "delete"):
+            # Children first, so deleting an item doesn't cascade to a row
+            # whose own delete is still to be checked.
+            for row in rows:
+                with self.subTest(write=write, model=type(row).__name__):
+                    self.get()
+                    self.assertEqual(self.get()["X-Cache"], "HIT")
+                    with mock.patch("shop.signals.schedule_derivatives"):
+                        getattr(row, write)()
+                    self.assertEqual(self.get()["X-Cache"], "MISS")
+
+    @override_settings(STORAGES={
+        **settings.STORAGES,
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    })
+    def test_only_successful_json_is_stored(self):
+        for url, accept in (
+            ("/shop/items/?fields=id", "text/html"),
+            ("/shop/items/?fields=nope", "application/json"),
+        ):
+            with self.subTest(url=url, accept=accept):
+                self.get(url, accept=accept)
+                self.assertEqual(self.get(url, accept=accept)["X-Cache"], "MISS")
+
+    def test_cache_stats_view_counts_hits_and_misses(self):
+        admin = get_user_model().objects.create_user(email="admin@example.com", password="pw", is_staff=True)
+        client = APIClient()
+        client.force_authenticate(admin)
+        before = client.get("/shop/cache-stats/").json()
+
+        self.get()
+        self.get()
+        self.get()
+        after = client.get("/shop/cache-stats/").json()
+        self.assertEqual(after["hits"] - before["hits"], 2)
+        self.assertEqual(after["misses"] - before["misses"], 1)
+        self.assertEqual(after["hit_ratio"], round(after["hits"] / (after["hits"] + after["misses"]), 4))
+
+        client.force_authenticate(get_user_model().objects.create_user(email="user@example.com", password="pw"))
+        self.assertEqual(client.get("/shop/cache-stats/").status_code, 403)
+
+
+class ConditionalGetTests(TestCase):
+    url = "/shop/items/?fields=id,title"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Watch")
+        Item.objects.create(
+            title="Watch", image="", price=100, number_of_items=3, discount_price=90,
+            product_id="SKU-1", brand_name="Acme", description="desc", category=cls.category,
+        )
+
+    def setUp(self):
+        get_cache().clear()
+
+    def get(self, **headers):
+        return self.client.get(self.url, HTTP_ACCEPT="application/json", **headers)
+
+    def test_matching_etag_is_a_304_without_queries(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.get(HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], first["ETag"])
+        self.assertEqual(response["Last-Modified"], first["Last-Modified"])
+        self.assertEqual(response.content, b"")
+
+    def test_unmodified_since_is_a_304_without_queries(self):
+        first = self.get()
+        with self.assertNumQueries(0):
+            response = self.get(HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], first["ETag"])
+        self.assertEqual(response["Last-Modified"], first["Last-Modified"])
+
+    def test_catalog_write_changes_the_etag(self):
+        first = self.get()
+        self.category.name = "Watches"
+        self.category.save()
+        response = self.get(HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+
+class BootstrapViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Watch")
+        cls.color = Color.objects.create(name="Red", code="#f00")
+        Districts.objects.create(title="Dhaka")
+        Slider.objects.create(image="images/slider/1.jpg", title="Sale")
+
+    def setUp(self):
+        get_cache().clear()
+
+    def get(self):
+        return self.client.get("/shop/bootstrap/", HTTP_ACCEPT="application/json")
+
+    def test_payload(self):
+        payload = self.get().json()
+        self.assertEqual(set(payload), {"version", *BootstrapView.sections})
+        self.assertEqual([row["name"] for row in payload["categories"]], ["Watch"])
+        self.assertEqual([row["code"] for row in payload["colors"]], ["#f00"])
+        self.assertEqual([row["title"] for row in payload["districts"]], ["Dhaka"])
+        self.assertEqual([row["title"] for row in payload["sliders"]], ["Sale"])
+        self.assertEqual(payload["hero_sections"], [])
+
+    def test_queries(self):
+        # One per reference table, then sliders and hero sections.
+        with self.assertNumQueries(len(BootstrapView.sections)):
+            self.assertEqual(self.get()["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get()["X-Cache"], "HIT")
+
+    def test_writes_invalidate(self):
+        first = self.get().json()
+        self.color.name = "Crimson"
+        self.color.save()
+        response = self.get()
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertNotEqual(response.json()["version"], first["version"])
+        self.assertEqual([row["name"] for row in response.json()["colors"]], ["Crimson"])
+
+
+class CatalogExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.items = [
+            Item.objects.create(
+                title=f"Watch, model {n}", image=f"images/{n}.jpg", price=100 + n, number_of_items=1,
+                discount_price=90, product_id=f"SKU{n}", brand_name="Acme", description="desc",
+            )
+            for n in range(3)
+        ]
+        # One stored document; the others are built while exporting.
+        rebuild_item_documents([cls.items[0].pk])
+
+    def export(self, *args):
+        out = io.StringIO()
+        call_command("export_catalog", *args, stdout=out)
+        return out.getvalue()
+
+    def test_ndjson_to_stdout(self):
+        documents = [json.loads(line) for line in self.export("--chunk-size", "2").splitlines()]
+        self.assertEqual([document["id"] for document in documents], [item.pk for item in self.items])
+        self.assertEqual(documents[1]["title"], "Watch, model 1")
+        self.assertEqual(documents[0]["image"], "/media/images/0.jpg")
+
+        absolute = json.loads(self.export("--base-url", "https://shop.example.com").splitlines()[0])
+        self.assertEqual(absolute["image"], "https://shop.example.com/media/images/0.jpg")
+
+    def test_csv_to_file(self):
+        output = os.path.join(tempfile.mkdtemp(), "catalog.csv")
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        message = self.export("--format", "csv", "--output", output)
+        self.assertIn(f"Exported 3 items to {output}", message)
+        with open(output, encoding="utf-8", newline="") as fh:
+            rows = list(csv.reader(fh))
+        self.assertEqual(rows[0][:3], ["id", "product_id", "title"])
+        self.assertEqual([row[2] for row in rows[1:]], [item.title for item in self.items])
+
+    def test_chunk_size_must_be_positive(self):
+        with self.assertRaises(CommandError):
+            self.export("--chunk-size", "0")
+
+    def test_view_streams_to_admins(self):
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(email="a@example.com", password="pw", is_staff=True))
+        response = client.get("/shop/export/items.ndjson")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="catalog.ndjson"')
+        documents = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(len(documents), 3)
+        self.assertEqual(documents[0]["image"], "http://testserver/media/images/0.jpg")
+
+        self.assertEqual(client.get("/shop/export/items.xml").status_code, 404)
+        client.force_authenticate(get_user_model().objects.create_user(email="b@example.com", password="pw"))
+        self.assertEqual(client.get("/shop/export/items.csv").status_code, 403)
+
+
+@override_settings(IMAGE_DERIVATIVE_WIDTHS=(16, 32, 64), IMAGE_DERIVATIVE_FORMATS=("webp",))
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        # Run the background jobs on a pool this test can wait for.
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        patcher = mock.patch("root.images._get_executor", return_value=self.executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def png(self, name):
+        buffer = io.BytesIO()
+        Image.new("RGB", (40, 20), (200, 30, 30)).save(buffer, format="PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def derivative_widths(self, name):
+        widths = []
+        for width in (16, 32, 64):
+            path = derivative_name(name, width, "webp")
+            if default_storage.exists(path):
+                with default_storage.open(path, "rb") as fh, Image.open(fh) as image:
+                    self.assertEqual(image.format, "WEBP")
+                    widths.append(image.width)
+        return widths
+
+    def test_saving_an_item_and_its_images_writes_derivatives(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            item = Item.objects.create(
+                title="Watch", image=self.png("watch.png"), price=100, number_of_items=1,
+                discount_price=90, product_id="SKU-1", brand_name="Acme", description="desc",
+            )
+            image = ItemImage.objects.create(item=item, image=self.png("side.png"))
+        self.executor.shutdown(wait=True)
+
+        # Narrower than 64px, so the widest derivative keeps the original size.
+        self.assertEqual(self.derivative_widths(item.image.name), [16, 32, 40])
+        self.assertTrue(default_storage.exists(derivative_name(image.image.name, 16, "webp")))
+
+    def test_command_backfills_missing_derivatives(self):
+        item = Item.objects.create(
+            title="Watch", image=self.png("watch.png"), price=100, number_of_items=1,
+            discount_price=90, product_id="SKU-1", brand_name="Acme", description="desc",
+        )
+        self.assertEqual(self.derivative_widths(item.image.name), [])
+
+        out = io.StringIO()
+        call_command("generate_image_derivatives", "--workers", "1", stdout=out)
+        self.assertIn("Wrote 3 derivatives for 1 images (0 failed).", out.getvalue())
+        self.assertEqual(self.derivative_widths(item.image.name), [16, 32, 40])
+
+        # Up-to-date derivatives are left alone.
+        call_command("generate_image_derivatives", "--workers", "1", stdout=out)
+        self.assertIn("Wrote 0 derivatives for 1 images (0 failed).", out.getvalue())
+
+
+class ItemPaginationTests(TestCase):
+    """Cursor pages must cover ties on price exactly once, past DRF's 1000-row offset cap."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Item.objects.bulk_create(
+            Item(
+                title=f"Item {n}", image="", price=50 if n % 10 == 0 else 100, number_of_items=1,
+                discount_price=1, product_id=f"SKU{n}", brand_name="Acme", description="desc",
+            )
+            for n in range(1400)
+        )
+
+    def walk(self, url, key="next"):
+        seen, pages = [], 0
+        while url and pages < 50:
+            page = self.client.get(url, HTTP_ACCEPT="application/json").json()
+            seen += [row["id"] for row in page["results"]]
+            url, pages = page[key], pages + 1
+        self.assertIsNone(url, "the walk never ended")
+        return seen
+
+    def test_tied_prices_are_paged_exactly_once(self):
+        by_price = list(Item.objects.order_by("price", "id").values_list("id", flat=True))
+        by_price_desc = list(Item.objects.order_by("-price", "-id").values_list("id", flat=True))
+        self.assertEqual(self.walk("/shop/items/?ordering=price&page_size=100&fields=id"), by_price)
+        self.assertEqual(self.walk("/shop/items/?ordering=-price&page_size=100&fields=id"), by_price_desc)
+
+    def test_previous_links_walk_back_to_the_start(self):
+        url = "/shop/items/?ordering=price&page_size=100&fields=id"
+        for _ in range(14):
+            page = self.client.get(url, HTTP_ACCEPT="application/json").json()
+            url = page["next"]
+        self.assertIsNone(url)
+        backwards = self.walk(page["previous"], key="previous")
+        expected = list(Item.objects.order_by("price", "id").values_list("id", flat=True))[:-100]
+        self.assertCountEqual(backwards, expected)
+        self.assertEqual(len(backwards), len(set(backwards)))
+
+    def test_bad_cursor_is_a_404(self):
+        response = self.client.get("/shop/items/?cursor=bm9wZQ==", HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 404)
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_identical_uploads_share_one_blob(self):
+        first = default_storage.save("images/watch.JPG", ContentFile(b"pixels"))
+        second = default_storage.save("item_images/watch-copy.jpg", ContentFile(b"pixels"))
+        self.assertEqual(first, second)
+        self.assertRegex(first, r"^blobs/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$")
+        self.assertNotEqual(default_storage.save("images/other.jpg", ContentFile(b"other")), first)
+
+    def test_blobs_are_served_immutable_with_ranges(self):
+        name = default_storage.save("images/watch.jpg", ContentFile(b"0123456789"))
+        response = self.client.get(f"/media/{name}")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(f"/media/{name}", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        partial = self.client.get(f"/media/{name}", HTTP_RANGE="bytes=2-4")
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial["Content-Range"], "bytes 2-4/10")
+        self.assertEqual(b"".join(partial.streaming_content), b"234")
+        self.assertEqual(self.client.get(f"/media/{name}", HTTP_RANGE="bytes=10-").status_code, 416)
+
+    def test_reusing_a_blob_protects_it_from_gc(self):
+        name = default_storage.save("images/watch.jpg", ContentFile(b"watch"))
+        os.utime(default_storage.path(name), (0, 0))
+        self.assertEqual(default_storage.save("images/again.jpg", ContentFile(b"watch")), name)
+
+        # Not referenced by any row yet, but saved a moment ago.
+        call_command("gc_media_blobs", min_age=1, stdout=io.StringIO())
+        self.assertTrue(default_storage.exists(name))
+
+    def test_gc_keeps_referenced_blobs_and_their_derivatives(self):
+        kept = default_storage.save("images/kept.jpg", ContentFile(b"kept"))
+        derivative = kept.replace(".jpg", ".320w.webp")
+        default_storage.save_derived(derivative, ContentFile(b"derived"))
+        orphan = default_storage.save("images/orphan.jpg", ContentFile(b"orphan"))
+        Item.objects.create(
+            title="Watch", image=kept, price=100, number_of_items=3, discount_price=90,
+            product_id="SKU-1", brand_name="Acme", description="desc",
+        )
+
+        call_command("gc_media_blobs", min_age=0, stdout=io.StringIO())
+        self.assertTrue(default_storage.exists(kept))
+        self.assertTrue(default_storage.exists(derivative))
+        self.assertFalse(default_storage.exists(orphan))
+
+
+@override_settings(SHOP_DELIVERY_CHARGE="60")
+class OrderTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email="buyer@example.com", password="pw")
+        for lines in ([("10.50", 2), ("3.00", 1)], [], [("99.99", 3)]):
+            order = Order.objects.create(
+                user=cls.user, first_name="A", last_name="B", phone_number="+8801700000000",
+                district="D", upozila="U", city="C", address="Addr", payment_method="cash",
+                phone_number_payment="01700000000",
+            )
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product="SKU", quantity=quantity, price=price, color="red", size="M")
+                for price, quantity in lines
+            )
+
+    def test_totals_are_annotated_in_one_query(self):
+        with self.assertNumQueries(1):
+            totals = [order.totals() for order in Order.objects.with_totals().order_by("pk")]
+        self.assertEqual(
+            [(t["subtotal"], t["item_count"], t["grand_total"]) for t in totals],
+            [
+                (Decimal("24.00"), 3, Decimal("84.00")),
+                (Decimal("0.00"), 0, Decimal("60.00")),
+                (Decimal("299.97"), 3, Decimal("359.97")),
+            ],
+        )
+
+    def test_total_price_without_annotation(self):
+        order = Order.objects.order_by("pk").first()
+        self.assertEqual(order.total_price, Decimal("84.00"))
+
+    def test_order_history_is_paginated_with_items(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        # Orders page (totals annotated) and one prefetch of their items.
+        with self.assertNumQueries(2):
+            page = client.get("/shop/orders/", {"page_size": 2}).json()
+        self.assertEqual([order["grand_total"] for order in page["results"]], ["359.97", "60.00"])
+        self.assertEqual(len(page["results"][0]["order_items"]), 1)
+
+        rest = client.get(page["next"]).json()
+        self.assertEqual([order["item_count"] for order in rest["results"]], [3])
+        self.assertIsNone(rest["next"])
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email="buyer@example.com", password="pw")
+        cls.shirt = Item.objects.create(
+            title="Shirt", image="images/shirt.jpg", price=500, number_of_items=5, discount_price=450,
+            product_id="SKU-S", brand_name="Acme", description="desc",
+        )
+        ItemSize.objects.create(item=cls.shirt, size=Size.objects.create(name="XL"), price_for_this_size=480)
+        cls.address = {
+            "first_name": "A", "last_name": "B", "phone_number": "+8801700000000", "district": "D",
+            "upozila": "U", "city": "C", "address": "Addr", "payment_method": "cash",
+            "phone_number_payment": "01700000000",
+        }
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_to_cart(self, size, quantity):
+        Cart.objects.create(
+            user_name=self.user, item=self.shirt, item_size=size, item_color_code="#000", quantity=quantity,
+        )
+
+    def test_cart_is_priced_and_closed_in_one_transaction(self):
+        self.add_to_cart("XL", 2)
+        self.add_to_cart("M", 1)
+        response = self.client.post("/shop/checkout/", {**self.address, "price": "1"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        lines = sorted((item["size"], item["price"]) for item in response.json()["order_items"])
+        self.assertEqual(lines, [("M", "450.00"), ("XL", "480.00")])
+        self.assertEqual(response.json()["subtotal"], "1410.00")
+        self.assertFalse(Cart.objects.filter(ordered=False).exists())
+
+        # The same line can be bought again once the first order is placed.
+        self.add_to_cart("XL", 1)
+        self.assertEqual(self.client.post("/shop/checkout/", self.address, format="json").status_code, 201)
+
+    def test_empty_cart_is_rejected(self):
+        response = self.client.post("/shop/checkout/", self.address, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class ImageDownloaderTests(TestCase):
+    def setUp(self):
+        self.source_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source_dir)
+        with open(f"{self.source_dir}/watch.jpg", "wb") as fh:
+            fh.write(b"jpeg")
+        self.outside = tempfile.NamedTemporaryFile()
+        self.addCleanup(self.outside.close)
+
+    def fetch(self, url, **kwargs):
+        with ImageDownloader(workers=1, source_dir=self.source_dir, **kwargs) as downloader:
+            return downloader.fetch(url)
+
+    def test_relative_paths_stay_inside_source_dir(self):
+        self.assertEqual(self.fetch("watch.jpg"), b"jpeg")
+        for url in (self.outside.name, f"../{self.outside.name}", "../../../../etc/hostname"):
+            with self.subTest(url=url), self.assertRaises(DownloadError):
+                self.fetch(url)
+
+    def test_file_urls_need_allow_local_files(self):
+        url = f"file://{self.outside.name}"
+        with self.assertRaises(DownloadError):
+            self.fetch(url)
+        self.assertEqual(self.fetch(url, allow_local_files=True), b"")
+        with self.assertRaises(DownloadError):
+            self.fetch("ftp://example.com/watch.jpg")
+
+
+class ReferenceTableTests(TestCase):
+    def test_rows_added_by_another_process_are_found(self):
+        get_reference_table(Category)
+        # bulk_create skips the signal that bumps the generation, like a
+        # write from a process that doesn't share this one's cache.
+        category = Category.objects.bulk_create([Category(name="Watches")])[0]
+        self.assertEqual(get_reference(Category, category.pk), category)
+        self.assertIn(category, get_reference_table(Category).all())
+        self.assertIsNone(get_reference(Category, category.pk + 1))
+
+        ItemType.objects.bulk_create([ItemType(name="Analog")])
+        found = get_or_create_references(ItemType, ["Analog", "Digital"])
+        self.assertEqual(ItemType.objects.filter(name="Analog").count(), 1)
+        self.assertEqual(set(found), {"Analog", "Digital"})
+
+    def test_rows_from_rolled_back_transactions_are_forgotten(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            get_or_create_reference(Category, "Phantom")
+            self.assertIsNotNone(get_reference_table(Category).get_by_name("Phantom"))
+            raise RuntimeError
+        self.assertIsNone(get_reference_table(Category).get_by_name("Phantom"))
+
+    def test_rolled_back_ids_handed_out_again_are_reloaded(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            phantom = get_or_create_reference(Category, "Phantom")
+            get_reference_table(Category)
+            raise RuntimeError
+        real = get_or_create_reference(Category, "Real")
+        self.assertEqual(get_reference(Category, real.pk).name, "Real")
+        self.assertIsNone(get_reference_table(Category).get_by_name("Phantom"))
+        self.assertEqual(get_reference(Category, phantom.pk), real if real.pk == phantom.pk else None)
+
+    @override_settings(SHOP_REFERENCE_TTL=0)
+    def test_tables_expire(self):
+        self.assertIsNot(get_reference_table(Size), get_reference_table(Size))
+
+
+class FacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.watch, cls.shoe = Category.objects.create(name="Watch"), Category.objects.create(name="Shoe")
+        cls.red, cls.blue = Color.objects.create(name="Red", code="#f00"), Color.objects.create(name="Blue", code="#00f")
+        cls.items = []
+        for n, (category, colors, price) in enumerate([
+            (cls.watch, [cls.red], 50),
+            (cls.watch, [cls.red, cls.blue], 150),
+            (cls.shoe, [cls.blue], 250),
+            (cls.shoe, [], 120),
+        ]):
+            item = Item.objects.create(
+                title=f"Item {n}", image="", price=price, number_of_items=1, discount_price=price,
+                product_id=f"SKU{n}", brand_name="Acme", description="desc", category=category,
+                is_featured=n == 0,
+            )
+            for color in colors:
+                ItemColor.objects.create(item=item, color=color)
+            cls.items.append(item)
+
+    def setUp(self):
+        get_cache().clear()
+        facets._index = None
+
+    def ids(self, filters):
+        return sorted(apply_facet_filters(Item.objects.all(), filters).values_list("pk", flat=True))
+
+    def bitmap_ids(self, filters):
+        bitmap = get_facet_index().filter_bitmap(filters)
+        return [item.pk for item in self.items if bitmap >> item.pk & 1]
+
+    def test_parse_facet_filters(self):
+        filters = parse_facet_filters({"category": "1, 2", "is_featured": "yes", "price_min": "100", "size": ""})
+        self.assertEqual(filters, {"category": {1, 2}, "is_featured": {True}, "price_min": 100})
+        with self.assertRaises(ValidationError) as raised:
+            parse_facet_filters({"color": "red", "is_featured": "maybe", "price_max": "1.5"})
+        self.assertEqual(set(raised.exception.detail), {"color", "is_featured", "price_max"})
+
+    def test_database_and_bitmap_filters_agree(self):
+        for filters in (
+            {},
+            {"category": {self.watch.pk}},
+            {"color": {self.red.pk, self.blue.pk}},
+            {"category": {self.shoe.pk}, "color": {self.blue.pk}},
+            {"is_featured": {False}, "price_min": 100, "price_max": 200},
+            {"price_min": 120},
+        ):
+            with self.subTest(filters=filters):
+                self.assertEqual(self.ids(filters), self.bitmap_ids(filters))
+
+    def test_counts_are_disjunctive(self):
+        counts = get_facet_index().counts({"category": {self.watch.pk}, "color": {self.blue.pk}})
+        # Each dimension is counted under the other dimensions' filters only.
+        self.assertEqual(counts["category"], [
+            {"value": self.watch.pk, "count": 1}, {"value": self.shoe.pk, "count": 1},
+        ])
+        self.assertEqual(counts["color"], [
+            {"value": self.red.pk, "count": 2}, {"value": self.blue.pk, "count": 1},
+        ])
+        self.assertEqual(counts["price"], [{"value": 100, "count": 1}])
+        self.assertEqual(counts["total"], 1)
+
+    def test_changes_are_applied_to_a_new_index(self):
+        before = get_facet_index()
+        Item.objects.filter(pk=self.items[3].pk).update(category=self.watch)
+        with self.captureOnCommitCallbacks(execute=True):
+            record_facet_change([self.items[3].pk])
+        after = get_facet_index()
+        self.assertIsNot(after, before)
+        self.assertEqual(before.filter_bitmap({"category": {self.watch.pk}}).bit_count(), 2)
+        self.assertEqual(after.filter_bitmap({"category": {self.watch.pk}}).bit_count(), 3)
+
+    def test_expired_index_is_served_while_it_rebuilds(self):
+        stale = get_facet_index()
+        started, release = threading.Event(), threading.Event()
+
+        def build(seq):
+            started.set()
+            release.wait(5)
+            return facets.FacetIndex()
+
+        with override_settings(SHOP_FACET_INDEX_TTL=0), \
+                mock.patch.object(facets.FacetIndex, "build", side_effect=build) as rebuild:
+            self.assertIs(get_facet_index(), stale)
+            self.assertTrue(started.wait(5))
+            self.assertIs(get_facet_index(), stale)
+            release.set()
+            facets._rebuild_thread.join(5)
+        self.assertEqual(rebuild.call_count, 1)
+        self.assertIsNot(get_facet_index(), stale)
+
+
+class JSONRendererTests(SimpleTestCase):
+    """FastJSONRenderer must write the same bytes as DRF's JSONRenderer."""
+
+    def assertSameJSON(self, data):
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_types(self):
+        for data in (
+            {"price": Decimal("1.10"), "total": Decimal("-12345678901234567890.5")},
+            [datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=timezone.utc), datetime(2024, 1, 2, 3, 4, 5)],
+            [datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=6))), date(2024, 1, 2), time(3, 4, 5)],
+            [timedelta(days=1, seconds=3), uuid.UUID(int=12345)],
+            {"text": "Ünïcode \u2028 <script>", "empty": None, "flags": [True, False]},
+        ):
+            with self.subTest(data=data):
+                self.assertSameJSON(data)
+
+    def test_integers_wider_than_64_bits(self):
+        for value in (2 ** 63 - 1, 2 ** 64, -(2 ** 63) - 1, 10 ** 30):
+            with self.subTest(value=value):
+                self.assertSameJSON({"id": value, "ids": [1, value]})
+
+    def test_floats(self):
+        for value in (0.1, 2.5, -0.0, 1e15, 1e16, 1.5e300, 1e-4, 1e-5, 1.234e-5, 1.5e-7):
+            with self.subTest(value=value):
+                self.assertSameJSON({"value": value})
+
+    def test_non_string_keys(self):
+        self.assertSameJSON({1: "int", True: "bool", None: "none", 1.5: "float", 1e16: "exponent"})
+
+
+class JSONParserTests(SimpleTestCase):
+    def parse(self, parser, body, **context):
+        return parser.parse(io.BytesIO(body), "application/json", context)
+
+    def test_matches_drf_parser(self):
+        for body in (b'{"a": [1, 2.5, "\xc3\xa9"]}', b"[]", b'"text"', b"18446744073709551615", b"-9223372036854775809", b"12345678901234567890123"):
+            with self.subTest(body=body):
+                self.assertEqual(self.parse(FastJSONParser(), body), self.parse(JSONParser(), body))
+
+    def test_invalid_json_is_a_parse_error(self):
+        for body in (b"{", b'{"a": NaN}', b"\xff"):
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                self.parse(FastJSONParser(), body)
+
+    def test_other_encodings_use_the_stdlib_parser(self):
+        body = '{"name": "café"}'.encode("latin-1")
+        self.assertEqual(self.parse(FastJSONParser(), body, encoding="latin-1"), {"name": "café"})
+
+
+class CompressionTests(SimpleTestCase):
+    def compress(self, response, accept_encoding="gzip"):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding("gzip, br"), "br")
+        self.assertEqual(choose_encoding("br;q=0.5, gzip"), "gzip")
+        self.assertEqual(choose_encoding("br;q=0, *;q=0.1", {"br": None, "gzip": None}), "gzip")
+        self.assertEqual(choose_encoding("gzip;q=bogus, identity"), None)
+        self.assertEqual(choose_encoding(""), None)
+
+    def test_only_api_payloads_are_compressed(self):
+        body = b'{"title": "watch"}' * 200
+        self.assertEqual(self.compress(HttpResponse(body, content_type="application/json"))["Content-Encoding"], "gzip")
+        html = self.compress(HttpResponse(body, content_type="text/html; charset=utf-8"))
+        self.assertFalse(html.has_header("Content-Encoding"))
+
+    def test_compressed_variants_are_reused(self):
+        cache = caches["items"]
+        cache.clear()
+        body = b'{"title": "watch"}' * 200
+
+        first = HttpResponse(body, content_type="application/json")
+        first.compressed_variants = CompressedVariants(cache, "detail", tag="v1")
+        compressed = self.compress(first).content
+        self.assertEqual(cache.get("detail:gzip"), ("v1", compressed))
+
+        # A later response for the same key skips compressing...
+        cache.set("detail:gzip", ("v1", b"stored"))
+        second = HttpResponse(body, content_type="application/json")
+        second.compressed_variants = CompressedVariants(cache, "detail", tag="v1")
+        self.assertEqual(self.compress(second).content, b"stored")
+
+        # ...unless the copy was made from another version of the body.
+        third = HttpResponse(body, content_type="application/json")
+        third.compressed_variants = CompressedVariants(cache, "detail", tag="v2")
+        self.assertEqual(self.compress(third).content, compressed)
+
+
+class DocumentRebuildTests(TestCase):
+    def test_one_rebuild_per_transaction(self):
+        with mock.patch("shop.documents.rebuild_item_documents") as rebuild, \
+                mock.patch("shop.signals.schedule_derivatives"):
+            with self.captureOnCommitCallbacks(execute=True):
+                item = Item.objects.create(
+                    title="Watch", image="images/watch.jpg", price=100, number_of_items=3,
+                    discount_price=90, product_id="SKU-1", brand_name="Acme", description="desc",
+                )
+                for n in range(5):
+                    ItemImage.objects.create(item=item, image=f"item_images/{n}.jpg")
+            rebuild.assert_called_once()
+            self.assertIn(item.pk, rebuild.call_args.args[0])
+
+            # A new transaction gets a new batch.
+            with self.captureOnCommitCallbacks(execute=True):
+                ItemImage.objects.create(item=item, image="item_images/5.jpg")
+            self.assertEqual(rebuild.call_count, 2)
+            self.assertEqual(rebuild.call_args.args[0], {item.pk})
+
+    def test_rolled_back_savepoint_does_not_drop_the_batch(self):
+        with mock.patch("shop.documents.rebuild_item_documents") as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        schedule_item_document_rebuild([101])
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+                schedule_item_document_rebuild([102])
+            rebuild.assert_called_once()
+            self.assertLessEqual({101, 102}, rebuild.call_args.args[0])
+
+
+class StageReportTests(TestCase):
+    def test_stages_add_up_and_nest(self):
+        with StageReport("test") as report:
+            with report.stage("outer") as outer:
+                for n in range(3):
+                    with report.stage("inner") as inner:
+                        inner.add(rows=2, bytes=10)
+                        Category.objects.count()
+                outer.add(rows=1)
+                Category.objects.count()
+
+            def worker():
+                with report.stage("inner") as inner:
+                    inner.add(rows=1)
+
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join()
+
+        data = report.as_dict(options={"batch_size": 2})
+        self.assertEqual(data["command"], "test")
+        self.assertEqual(data["options"], {"batch_size": 2})
+        self.assertEqual(list(data["stages"]), ["outer", "inner"])
+        inner, outer = data["stages"]["inner"], data["stages"]["outer"]
+        self.assertEqual((inner["calls"], inner["rows"], inner["bytes"], inner["queries"]), (4, 7, 30, 3))
+        # The outer stage counts its own queries and those of the stages inside it.
+        self.assertEqual((outer["calls"], outer["rows"], outer["queries"]), (1, 1, 4))
+        self.assertGreater(data["elapsed_seconds"], 0)
+
+    def test_import_products_prints_and_writes_the_report(self):
+        source_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source_dir)
+        feed, report_path = f"{source_dir}/products.json", f"{source_dir}/report.json"
+        with open(feed, "w") as fh:
+            json.dump({"products": [{
+                "sku": "SKU-0", "title": "Watch", "category": "watches", "price": 100, "stock": 3,
+                "brand": "Acme", "description": "desc",
+            }]}, fh)
+
+        stdout = io.StringIO()
+        call_command("import_products", file=feed, report=report_path, stdout=stdout, stderr=io.StringIO())
+        table = stdout.getvalue()
+        self.assertRegex(table, r"\nstage\s+calls\s+wall s\s+cpu s\s+rows\s+rows/s\s+MiB\s+MiB/s\s+queries\n")
+        self.assertRegex(table, r"\nparse\s+1\s")
+        self.assertRegex(table, r"\nwrite\s+1\s")
+        self.assertIn(f"Stage report written to {report_path}", table)
+
+        with open(report_path, encoding="utf-8") as fh:
+            report = json.load(fh)
+        self.assertEqual(report["command"], "import_products")
+        self.assertEqual(report["options"]["file"], feed)
+        self.assertNotIn("report", report["options"])
+        self.assertEqual(report["stages"]["parse"]["rows"], 1)
+        self.assertGreater(report["stages"]["write"]["queries"], 0)
+
+
+class ImportProductsTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.source_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source_dir)
+        self.products = []
+        for n in range(4):
+            with open(f"{self.source_dir}/{n}.jpg", "wb") as fh:
+                fh.write(f"jpeg {n}".encode())
+            self.products.append({
+                "sku": f"SKU-{n}", "title": f"Watch {n}", "category": "watches", "rating": 4,
+                "price": 100 + n, "stock": 3, "brand": "Acme", "description": "desc",
+                "thumbnail": f"{n}.jpg", "images": [f"{n}.jpg"],
+            })
+        self.feed = f"{self.source_dir}/products.json"
+        with open(self.feed, "w") as fh:
+            json.dump({"products": self.products}, fh)
+
+    def run_import(self, **options):
+        stdout = io.StringIO()
+        with mock.patch("shop.management.commands.import_products.schedule_derivatives"), \
+                mock.patch("shop.signals.schedule_derivatives"):
+            call_command("import_products", file=self.feed, stdout=stdout, stderr=io.StringIO(), **options)
+        return {
+            label.lower(): int(count)
+            for label, count in re.findall(r"(Created|Updated|Unchanged|Errors)\s*: (\d+)", stdout.getvalue())
+        }
+
+    def test_unchanged_feed_writes_nothing(self):
+        self.assertEqual(self.run_import(), {"created": 4})
+        with mock.patch("shop.downloads.ImageDownloader.fetch") as fetch:
+            self.assertEqual(self.run_import(), {"created": 0, "unchanged": 4})
+        fetch.assert_not_called()
+
+    def test_deleted_items_are_imported_again(self):
+        self.run_import()
+        Item.objects.filter(product_id="SKU-1").delete()
+        self.assertEqual(self.run_import(), {"created": 1, "unchanged": 3})
+        self.assertTrue(Item.objects.filter(product_id="SKU-1").exists())
+
+    def test_bulk_import_refreshes_every_read_path(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.run_import()
+        urls = {
+            "list": "/shop/items/",
+            "detail": "/shop/items/product/SKU-0/",
+            "search": "/shop/items/search/?q=chronograph",
+            "facets": "/shop/items/facets/",
+        }
+        for url in urls.values():
+            self.client.get(url, HTTP_ACCEPT="application/json")
+
+        self.products[0].update(title="Chronograph 0", category="clocks", price=150)
+        self.products.append({**self.products[1], "sku": "SKU-4", "title": "Watch 4"})
+        with open(self.feed, "w") as fh:
+            json.dump({"products": self.products}, fh)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.run_import(bulk=True), {"created": 1, "updated": 1, "unchanged": 3})
+
+        responses = {
+            name: self.client.get(url, HTTP_ACCEPT="application/json").json() for name, url in urls.items()
+        }
+        self.assertEqual(
+            sorted((item["product_id"], item["title"], item["price"]) for item in responses["list"])[:2],
+            [("SKU-0", "Chronograph 0", 150), ("SKU-1", "Watch 1", 101)],
+        )
+        self.assertEqual(len(responses["list"]), 5)
+        self.assertEqual(responses["detail"]["title"], "Chronograph 0")
+        self.assertEqual([item["product_id"] for item in responses["search"]["results"]], ["SKU-0"])
+        clocks = Category.objects.get(name="Clocks")
+        self.assertIn({"value": clocks.pk, "count": 1}, responses["facets"]["category"])
+        self.assertEqual(responses["facets"]["total"], 5)
+
+    def test_interrupted_import_resumes(self):
+        from shop.management.commands.import_products import Command
+
+        original = Command._import_single_product
+
+        def interrupt_at_third(command, p, *args):
+            if p["sku"] == "SKU-2":
+                raise KeyboardInterrupt
+            return original(command, p, *args)
+
+        with mock.patch.object(Command, "_import_single_product", interrupt_at_third):
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_import()
+        self.assertEqual(Item.objects.count(), 2)
+        self.assertEqual(self.run_import(), {"created": 2, "unchanged": 2})
+
+
+@mock.patch("shop.feeds.CHUNK_SIZE", 7)
+class ProductFeedTests(SimpleTestCase):
+    """Read with 7-character chunks, so values straddle chunk boundaries."""
+
+    products = [
+        {"sku": "SKU-1", "title": "Wätch \"Pro\" \u2013 ünïcode", "price": 1234567.125, "tags": []},
+        {"sku": "SKU-2", "rating": -3e-2, "nested": {"a": [1, {"b": None}]}, "stock": 10},
+        {"sku": "SKU-3", "price": 7},
+    ]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def read(self, name, data, **kwargs):
+        path = f"{self.directory}/{name}"
+        with open(path, "wb") as fh:
+            fh.write(data)
+        with ProductFeed(path, **kwargs) as feed:
+            return list(feed)
+
+    def test_json_object_with_other_keys(self):
+        data = json.dumps({"total": 3, "meta": {"products": "no"}, "products": self.products, "skip": 0})
+        self.assertEqual(self.read("feed.json", data.encode()), self.products)
+        self.assertEqual(self.read("empty.json", b'{"total": 0}'), [])
+
+    def test_top_level_array_with_whitespace_and_bom(self):
+        data = "\ufeff [\n" + ",\n  ".join(json.dumps(p) for p in self.products) + "\n]\n"
+        self.assertEqual(self.read("feed.json", data.encode()), self.products)
+        self.assertEqual(self.read("empty.json", b"[ ]"), [])
+
+    def test_ndjson_and_gzip(self):
+        lines = "\n".join(json.dumps(p) for p in self.products) + "\n\n"
+        self.assertEqual(self.read("feed.ndjson", lines.encode()), self.products)
+        self.assertEqual(self.read("feed.jsonl.gz", gzip.compress(lines.encode())), self.products)
+        # Compression is detected from the content, not just the name.
+        data = gzip.compress(json.dumps({"products": self.products}).encode())
+        self.assertEqual(self.read("feed.json", data), self.products)
+        self.assertEqual(self.read("feed.txt", lines.encode(), format="ndjson"), self.products)
+
+    def test_malformed_feeds(self):
+        for name, data in (
+            ("truncated.json", b'{"products": [{"sku": "SKU-1"}, {"sku": "SK'),
+            ("unclosed.json", b'{"products": [{"sku": "SKU-1"}'),
+            ("comma.json", b'[{"sku": "SKU-1"} {"sku": "SKU-2"}]'),
+            ("scalar.json", b'"products"'),
+            ("object.json", b'{"products": [] "total": 1}'),
+            ("feed.ndjson", b'{"sku": "SKU-1"}\n{"sku": \n'),
+        ):
+            with self.subTest(name=name), self.assertRaises(FeedError):
+                self.read(name, data)
+        with self.assertRaises(FeedError):
+            self.read("feed.json", b"[]", format="xml")
+
+    def test_number_split_at_the_decimal_point(self):
+        # The first chunk is "[12345.", which alone decodes as 12345.
+        self.assertEqual(self.read("feed.json", b"[12345.5, -1e-5]"), [12345.5, -1e-5])
+
+    def test_corrupt_feed_is_not_read_to_the_end(self):
+        path = f"{self.directory}/feed.json"
+        with open(path, "wb") as fh:
+            fh.write(b'{"products": [{"sku": "SKU-1" "title": "x"}, ' + b'{"sku": "SKU-2"}, ' * 10000 + b"]}")
+        with ProductFeed(path) as feed:
+            with self.assertRaises(FeedError):
+                list(feed)
+            # The text layer reads ahead in 8 KiB blocks; the feed is ~190 KB.
+            self.assertLessEqual(feed.bytes_read, 16 * 1024)
+
+    @mock.patch("shop.feeds.MAX_VALUE_SIZE", 100)
+    def test_oversized_value_is_rejected(self):
+        with self.assertRaises(FeedError):
+            self.read("feed.json", b'[{"title": "' + b"x" * 10000 + b'"}]')
+        # Values under the limit still read across many chunks.
+        self.assertEqual(self.read("feed.json", b'[{"title": "' + b"x" * 80 + b'"}]'), [{"title": "x" * 80}])
+
+
+class SQLiteFTSBackendTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.backend = SQLiteFTSBackend()
+        self.category = Category.objects.create(name="Watches")
+        self.item_type = ItemType.objects.create(name="Analog")
+
+    def create_item(self, n, title, description="desc", **kwargs):
+        return Item.objects.create(
+            title=title, image="", price=100, number_of_items=1, discount_price=90,
+            product_id=f"SKU-{n}", brand_name="Acme", description=description, **kwargs,
+        )
+
+    def test_index_follows_saves_and_deletes(self):
+        item = self.create_item(1, "Chronograph")
+        self.assertEqual(self.backend.search("chrono", 10), [item.pk])
+
+        item.title = "Diver"
+        item.save()
+        self.assertEqual(self.backend.search("chronograph", 10), [])
+        self.assertEqual(self.backend.search("diver", 10), [item.pk])
+
+        item.delete()
+        self.assertEqual(self.backend.search("diver", 10), [])
+
+    def test_category_and_type_renames_reindex_items(self):
+        item = self.create_item(1, "Chronograph", category=self.category, type=self.item_type)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Clocks"
+            self.category.save()
+        self.assertEqual(self.backend.search("clocks", 10), [item.pk])
+        self.assertEqual(self.backend.search("watches", 10), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item_type.delete()
+        self.assertEqual(self.backend.search("analog", 10), [])
+        self.assertEqual(self.backend.search("chronograph clocks", 10), [item.pk])
+
+    def test_fts_syntax_is_matched_literally(self):
+        # FTS5 operators are only matched as the words they spell.
+        item = self.create_item(1, "Chronograph or near")
+        self.create_item(2, "Diver")
+        for query in ('chronograph"', "chronograph*", "NEAR(chronograph)", "-chronograph", "(chronograph OR"):
+            with self.subTest(query=query):
+                self.assertEqual(self.backend.search(query, 10), [item.pk])
+        self.assertEqual(self.backend.search("title:chronograph", 10), [])
+        self.assertEqual(self.backend.search('"*^:()', 10), [])
+
+    def test_title_matches_rank_first(self):
+        in_description = self.create_item(1, "Diver", description="A chronograph movement")
+        in_title = self.create_item(2, "Chronograph")
+        self.assertEqual(self.backend.search("chronograph", 10), [in_title.pk, in_description.pk])
+
+    def test_search_view_pages(self):
+        items = [self.create_item(n, f"Chronograph {n}") for n in range(5)]
+        expected = self.backend.search("chronograph", 10)
+        self.assertCountEqual(expected, [item.pk for item in items])
+
+        seen = []
+        url = "/shop/items/search/?q=chronograph&page_size=2"
+        pages = 0
+        while url:
+            page = self.client.get(url, HTTP_ACCEPT="application/json").json()
+            seen += [result["id"] for result in page["results"]]
+            self.assertEqual(page["previous"] is None, pages == 0)
+            url, pages = page["next"], pages + 1
+        self.assertEqual((pages, seen), (3, expected))
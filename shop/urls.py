@@ -2,8 +2,12 @@ from django.urls import path
 
 from .views import (
     BillingAddressViews,
+    BootstrapView,
+    CacheStatsView,
     CartViews,
+    CatalogExportView,
     CategoryViews,
+    CheckoutViews,
     ColorViews,
     ContactMessageViews,
     CouponViews,
@@ -11,7 +15,9 @@ from .views import (
     HeroSectionViews,
     ItemDetailViews,
     ItemColorViews,
+    ItemFacetViews,
     ItemImageViews,
+    ItemSearchViews,
     ItemSizeViews,
     ItemTypeViews,
     ItemViews,
@@ -25,8 +31,12 @@ from .views import (
 ) 
 
 urlpatterns = [
+    path('bootstrap/', BootstrapView.as_view(), name='bootstrap'),
     path('items/', ItemViews.as_view(), name='items'),
+    path('items/facets/', ItemFacetViews.as_view(), name='item-facets'),
+    path('items/search/', ItemSearchViews.as_view(), name='item-search'),
     path('items/<int:pk>/', ItemDetailViews.as_view(), name='item-detail'),
+    path('items/product/<str:product_id>/', ItemDetailViews.as_view(), name='item-detail-product'),
     path('districts/', DistrictsViews.as_view(), name='districts'),
     path('categories/', CategoryViews.as_view(), name='categories'),
     path('item-types/', ItemTypeViews.as_view(), name='item-types'),
@@ -46,4 +56,7 @@ urlpatterns = [
     path('contacts/', ContactMessageViews.as_view(), name='contacts'),
     path('orders/', OrderViews.as_view(), name='orders'),
     path('order-items/', OrderItemViews.as_view(), name='order-items'),
+    path('checkout/', CheckoutViews.as_view(), name='checkout'),
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('export/items.<str:export_format>', CatalogExportView.as_view(), name='catalog-export'),
 ]
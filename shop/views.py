@@ -1,6 +1,11 @@
 
-from rest_framework import generics
+from django.http import Http404, StreamingHttpResponse
+from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework.views import APIView
 from .models import ( BillingAddress, Cart, Category, Color, 
                      ContactMessage, Coupon, Districts, HeroSection, 
                      Item, ItemColor, ItemImage, ItemSize, ItemType, Order, 
@@ -8,28 +13,117 @@ from .models import ( BillingAddress, Cart, Category, Color,
 )
 
 from .serializers import (
-    ItemSerilizers, ItemImageSerilizers, ItemSizeSerilizers, ItemColorSerilizers,
+    ItemSerilizers, ItemListSerilizers, ItemDocumentSerializer, ItemImageSerilizers, ItemSizeSerilizers, ItemColorSerilizers,
     CategorySerilizers, ItemTypeSerilizers, HeroSectionSerilizers, 
     DistrictsSerilizers, ContactMessageSerilizers, SliderSerilizers,
     BillingAddressSerilizers, PaymentSerilizers, CouponSerilizers, RefundSerilizers,
     CartSerilizers, OrderSerilizers, OrderItemSerilizers, RatingSerilizers, 
     SizeSerilizers, ColorSerilizers
 )
+from .checkout import CheckoutError, checkout
+from .cache import (
+    CachedResponseMixin, ConditionalGetMixin, ItemDetailCacheMixin, cache_stats, catalog_version,
+)
+from .export import EXPORT_FORMATS, iter_item_documents
+from .fastpath import FastPathSerializer, compile_serializer
+from .facets import apply_facet_filters, get_facet_index, parse_facet_filters
+from .pagination import ItemCursorPagination, OrderCursorPagination
+from .reference import REFERENCE_MODELS, get_reference_table
+from .search import get_search_backend
+
+class ReferenceListMixin:
+    """List a reference table from the in-process registry instead of the database."""
+
+    def get_queryset(self):
+        return get_reference_table(self.queryset.model).all()
+
+
+class ItemFieldsMixin:
+    """
+    Sparse fieldsets for the item endpoints.
+
+    ``?fields=title,price`` picks flat fields (the grid fields by default) and
+    ``?expand=images,item_size`` adds nested relations; only the columns and
+    relations those need are loaded. Without either parameter the full
+    stored document is returned.
+    """
+
+    def get_sparse_fields(self):
+        if not hasattr(self, "_sparse_fields"):
+            self._sparse_fields = self._parse_sparse_fields()
+        return self._sparse_fields
+
+    def _parse_sparse_fields(self):
+        request = getattr(self, "request", None)
+        if request is None:
+            return None
+        params = request.query_params
+        if "fields" not in params and "expand" not in params:
+            return None
+
+        def split(value):
+            return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+        expandable = ItemSerilizers.expandable_fields
+        requested = split(params.get("fields")) or list(ItemListSerilizers.default_fields)
+        fields = [name for name in requested if name not in expandable]
+        expand = [name for name in requested if name in expandable]
+        expand += [name for name in split(params.get("expand")) if name not in expand]
+
+        flat = set(ItemListSerilizers().fields)
+        unknown = [name for name in fields if name not in flat]
+        unknown += [name for name in expand if name not in expandable]
+        if unknown:
+            raise ValidationError({"fields": [f"Unknown field(s): {', '.join(unknown)}."]})
+        return fields, expand
+
+    def get_compiled_serializer(self):
+        fields, expand = self.get_sparse_fields()
+        serializer_class = ItemSerilizers if expand else ItemListSerilizers
+        return compile_serializer(serializer_class, (*fields, *expand))
+
+    def get_serializer_class(self):
+        if self.get_sparse_fields() is None:
+            return ItemDocumentSerializer
+        return FastPathSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        if self.get_sparse_fields() is not None:
+            kwargs["compiled"] = self.get_compiled_serializer()
+        return super().get_serializer(*args, **kwargs)
+
+    def get_item_queryset(self):
+        if self.get_sparse_fields() is None:
+            # Nested images/sizes/colors come from the stored document, so a
+            # page of items is a single query on the item table.
+            return Item.objects.all()
+
+        # Sparse responses are built from plain rows by the compiled
+        # serializer; nested relations are fetched once per page. id and
+        # price are always selected because the keyset paginator orders on them.
+        columns = self.get_compiled_serializer().columns
+        return Item.objects.values(*dict.fromkeys([*columns, "id", "price"]))
 
-class ItemViews(generics.ListAPIView):
+
+class ItemViews(ItemFieldsMixin, ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
-    serializer_class = ItemSerilizers
+    cache_models = (
+        Item, ItemImage, ItemSize, ItemColor, Size, Color, Category, ItemType, Rating,
+    )
+    pagination_class = ItemCursorPagination
+
+    def get_facet_filters(self):
+        if not hasattr(self, "_facet_filters"):
+            self._facet_filters = parse_facet_filters(self.request.query_params)
+        return self._facet_filters
 
     def get_queryset(self):
-        queryset = Item.objects.select_related(
-            "ratings",
-            "category",
-            "type",
-        ).prefetch_related(
-            "images",
-            "item_size__size",
-            "item_color__color",
-        )
+        queryset = apply_facet_filters(self.get_item_queryset(), self.get_facet_filters())
+
+        # The legacy ``limit`` slice can't be combined with keyset paging,
+        # which has to filter and order the queryset itself.
+        if self.paginator.is_requested(self.request):
+            return queryset
 
         limit = self.request.query_params.get('limit', None)
         if limit is not None:
@@ -40,51 +134,134 @@ class ItemViews(generics.ListAPIView):
 
         return queryset
 
-class ItemDetailViews(generics.RetrieveAPIView):
-    permission_classes = [AllowAny]
-    serializer_class = ItemSerilizers
-    queryset = Item.objects.select_related(
-        "ratings",
-        "category",
-        "type",
-    ).prefetch_related(
-        "images",
-        "item_size__size",
-        "item_color__color",
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get("facets", "").lower() in ("1", "true", "yes"):
+            facets = get_facet_index().counts(self.get_facet_filters())
+            if isinstance(response.data, list):
+                response.data = {"results": response.data, "facets": facets}
+            else:
+                response.data["facets"] = facets
+        return response
+
+
+class ItemFacetViews(ConditionalGetMixin, CachedResponseMixin, APIView):
+    """Facet counts for the item filters in the query string, without results."""
+
+    permission_classes = [AllowAny]
+    cache_models = (Item, ItemSize, ItemColor, Category, ItemType, Rating)
+
+    def get(self, request):
+        return Response(get_facet_index().counts(parse_facet_filters(request.query_params)))
+
+class ItemDetailViews(ItemFieldsMixin, ConditionalGetMixin, ItemDetailCacheMixin, generics.RetrieveAPIView):
+    """Item detail by primary key (``items/<pk>/``) or ``product_id`` (``items/product/<product_id>/``)."""
+
+    permission_classes = [AllowAny]
+    cache_models = (
+        Item, ItemImage, ItemSize, ItemColor, Size, Color, Category, ItemType, Rating,
     )
 
-class ItemImageViews(generics.ListAPIView):
+    @property
+    def lookup_field(self):
+        return "product_id" if "product_id" in self.kwargs else "pk"
+
+    def get_item_lookup(self, kwargs):
+        if "product_id" in kwargs:
+            return "product_id", kwargs["product_id"]
+        return "pk", kwargs["pk"]
+
+    def resolve_item_pk(self, field, value):
+        return Item.objects.filter(**{field: value}).values_list("pk", flat=True).first()
+
+    def get_queryset(self):
+        return self.get_item_queryset()
+
+class ItemSearchViews(ItemFieldsMixin, ConditionalGetMixin, CachedResponseMixin, generics.GenericAPIView):
+    """Ranked full-text search over the catalog: ``?q=&page=&page_size=``."""
+
+    permission_classes = [AllowAny]
+    cache_models = (
+        Item, ItemImage, ItemSize, ItemColor, Size, Color, Category, ItemType, Rating,
+    )
+    page_size = 24
+    max_page_size = 100
+
+    def _positive_int(self, name, default, maximum=None):
+        try:
+            value = int(self.request.query_params[name])
+        except (KeyError, ValueError):
+            return default
+        if value < 1:
+            return default
+        return min(value, maximum) if maximum else value
+
+    def get(self, request):
+        query = request.query_params.get("q", "").strip()
+        page = self._positive_int("page", 1)
+        page_size = self._positive_int("page_size", self.page_size, self.max_page_size)
+
+        # One extra id tells us whether there is a next page without a COUNT.
+        ids = get_search_backend().search(query, page_size + 1, (page - 1) * page_size)
+        has_next = len(ids) > page_size
+        ids = ids[:page_size]
+
+        rows = self.get_item_queryset().filter(pk__in=ids)
+        items = {row["id"] if isinstance(row, dict) else row.pk: row for row in rows}
+        results = [items[pk] for pk in ids if pk in items]
+
+        url = request.build_absolute_uri()
+        previous = None
+        if page == 2:
+            previous = remove_query_param(url, "page")
+        elif page > 2:
+            previous = replace_query_param(url, "page", page - 1)
+        return Response({
+            "query": query,
+            "next": replace_query_param(url, "page", page + 1) if has_next else None,
+            "previous": previous,
+            "results": self.get_serializer(results, many=True).data,
+        })
+
+class ItemImageViews(ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
+    cache_models = (ItemImage,)
     serializer_class = ItemImageSerilizers
     queryset = ItemImage.objects.all()
     
-class ItemSizeViews(generics.ListAPIView):
+class ItemSizeViews(ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
+    cache_models = (ItemSize, Size)
     serializer_class = ItemSizeSerilizers
     queryset = ItemSize.objects.all()
     
-class ItemColorViews(generics.ListAPIView):
+class ItemColorViews(ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
+    cache_models = (ItemColor, Color)
     serializer_class = ItemColorSerilizers
     queryset = ItemColor.objects.all()
     
-class CategoryViews(generics.ListAPIView):
+class CategoryViews(ReferenceListMixin, ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
+    cache_models = (Category,)
     serializer_class = CategorySerilizers
     queryset = Category.objects.all()
     
-class ItemTypeViews(generics.ListAPIView):
+class ItemTypeViews(ReferenceListMixin, ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
+    cache_models = (ItemType,)
     serializer_class = ItemTypeSerilizers
     queryset = ItemType.objects.all()
     
-class HeroSectionViews(generics.ListAPIView):
+class HeroSectionViews(ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
+    cache_models = (HeroSection,)
     serializer_class = HeroSectionSerilizers
     queryset = HeroSection.objects.all()
     
-class DistrictsViews(generics.ListAPIView):
+class DistrictsViews(ReferenceListMixin, ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
+    cache_models = (Districts,)
     serializer_class = DistrictsSerilizers
     queryset = Districts.objects.all()
     
@@ -94,8 +271,9 @@ class ContactMessageViews(generics.CreateAPIView):
     queryset = ContactMessage.objects.all()
     
     
-class SliderViews(generics.ListAPIView):
+class SliderViews(ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
+    cache_models = (Slider,)
     serializer_class = SliderSerilizers
     queryset = Slider.objects.all()
     
@@ -127,20 +305,23 @@ class RefundViews(generics.CreateAPIView):
     queryset = Refund.objects.all()
 
 
-class RatingViews(generics.ListAPIView):
+class RatingViews(ReferenceListMixin, ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
+    cache_models = (Rating,)
     serializer_class = RatingSerilizers
     queryset = Rating.objects.all()
 
 
-class SizeViews(generics.ListAPIView):
+class SizeViews(ReferenceListMixin, ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
+    cache_models = (Size,)
     serializer_class = SizeSerilizers
     queryset = Size.objects.all()
 
 
-class ColorViews(generics.ListAPIView):
+class ColorViews(ReferenceListMixin, ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
+    cache_models = (Color,)
     serializer_class = ColorSerilizers
     queryset = Color.objects.all()
 
@@ -161,16 +342,89 @@ class OrderViews(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = OrderSerilizers
     queryset = Order.objects.all()
+    pagination_class = OrderCursorPagination
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return (
+            Order.objects.filter(user=self.request.user)
+            .with_totals()
+            .prefetch_related("order_items")
+        )
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 
+class CheckoutViews(APIView):
+    """Place an order for the user's open cart, priced on the server."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = OrderSerilizers(data=request.data, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        try:
+            order = checkout(request.user, **serializer.validated_data)
+        except CheckoutError as exc:
+            raise ValidationError({"cart": [str(exc)]})
+        order = Order.objects.with_totals().prefetch_related("order_items").get(pk=order.pk)
+        return Response(
+            OrderSerilizers(order, context={"request": request}).data, status=status.HTTP_201_CREATED
+        )
+
+
 class OrderItemViews(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = OrderItemSerilizers
     queryset = OrderItem.objects.all()
-    
\ No newline at end of file
+
+
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats())
+
+
+class BootstrapView(ConditionalGetMixin, CachedResponseMixin, APIView):
+    """
+    Every small storefront reference table in one payload.
+
+    ``version`` changes whenever any of the tables does, so clients can keep
+    their copy until it differs (or send the ETag back for a 304).
+    """
+
+    permission_classes = [AllowAny]
+    sections = {
+        "categories": (Category, CategorySerilizers),
+        "item_types": (ItemType, ItemTypeSerilizers),
+        "sizes": (Size, SizeSerilizers),
+        "ratings": (Rating, RatingSerilizers),
+        "colors": (Color, ColorSerilizers),
+        "districts": (Districts, DistrictsSerilizers),
+        "sliders": (Slider, SliderSerilizers),
+        "hero_sections": (HeroSection, HeroSectionSerilizers),
+    }
+    cache_models = tuple(model for model, _ in sections.values())
+
+    def get(self, request):
+        context = {"request": request}
+        payload = {"version": catalog_version(self.cache_models)}
+        for name, (model, serializer_class) in self.sections.items():
+            rows = get_reference_table(model).all() if model in REFERENCE_MODELS else model.objects.all()
+            payload[name] = serializer_class(rows, many=True, context=context).data
+        return Response(payload)
+
+
+class CatalogExportView(APIView):
+    """Stream the whole catalog as NDJSON or CSV (``/shop/export/items.<format>``)."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, export_format):
+        if export_format not in EXPORT_FORMATS:
+            raise Http404
+        writer, content_type = EXPORT_FORMATS[export_format]
+        documents = iter_item_documents(absolute=request.build_absolute_uri)
+        response = StreamingHttpResponse(writer(documents), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="catalog.{export_format}"'
+        return response